@@ -0,0 +1,18 @@
+import tempfile
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def temp_media_root(settings):
+    # Картинки из mixer и форм не должны попадать в настоящий MEDIA_ROOT
+    with tempfile.TemporaryDirectory() as temp_directory:
+        settings.MEDIA_ROOT = temp_directory
+        yield temp_directory
+
+
+@pytest.fixture(autouse=True)
+def test_settings(settings):
+    # То же, что core.test_runner.TestRunner для manage.py test
+    settings.QUERY_BUDGET_STRICT = True
+    settings.SLOW_QUERY_LOG = None
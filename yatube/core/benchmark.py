@@ -0,0 +1,79 @@
+"""Статистика замеров и сравнение с сохранённым базовым прогоном.
+
+Используется командами ``benchmark_views`` и ``microbench``: обе
+пишут результаты в JSON вида {имя: {метрика: значение}}, и любой
+прошлый такой файл можно передать как базовый.
+"""
+import json
+import math
+import statistics
+import time
+
+
+def percentile(samples, q):
+    """Процентиль q (0-100) методом ближайшего ранга."""
+    ordered = sorted(samples)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples, unit=1000):
+    """Сводка по замерам в секундах; времена - в мс при unit=1000."""
+    return {
+        'runs': len(samples),
+        'min': min(samples) * unit,
+        'mean': statistics.mean(samples) * unit,
+        'stdev': (
+            statistics.stdev(samples) * unit if len(samples) > 1 else 0.0
+        ),
+        'p50': percentile(samples, 50) * unit,
+        'p95': percentile(samples, 95) * unit,
+        'p99': percentile(samples, 99) * unit,
+    }
+
+
+def measure(func, warmup=2, repeats=20, number=100):
+    """Время одного вызова func в микросекундах.
+
+    Сначала warmup прогонов не в счёт (кэши шаблонов, импорт), затем
+    repeats замеров по number вызовов; в статистику идёт среднее на
+    вызов в каждом замере, поэтому шум таймера не влияет на результат.
+    """
+    for _ in range(warmup * number):
+        func()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return summarize(samples, unit=1_000_000)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file_obj:
+        return json.load(file_obj)
+
+
+def save(path, results):
+    with open(path, 'w', encoding='utf-8') as file_obj:
+        json.dump(results, file_obj, ensure_ascii=False, indent=2)
+
+
+def compare(results, baseline, metrics, tolerance):
+    """Регрессии: метрики, выросшие больше чем на tolerance (доля).
+
+    Возвращает список (имя, метрика, было, стало).
+    """
+    regressions = []
+    for name, values in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in metrics:
+            if metric not in values or metric not in previous:
+                continue
+            before, after = previous[metric], values[metric]
+            if after > before * (1 + tolerance):
+                regressions.append((name, metric, before, after))
+    return regressions
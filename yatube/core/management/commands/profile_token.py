@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = 'Выдаёт одноразовый токен для заголовка X-Profile'
+
+    def handle(self, *args, **options):
+        minutes = getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 60 * 60) // 60
+        self.stdout.write(profiling.make_token())
+        self.stderr.write(
+            f'Токен действует {minutes} мин. на один запрос'
+        )
@@ -0,0 +1,78 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import slow_queries
+from core.benchmark import percentile
+
+ORDERS = ('total', 'calls', 'p95')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных SQL-запросов: формы запросов по '
+        'суммарному времени, числу вызовов и p95. Время и вызовы '
+        'пересчитываются с учётом доли выборки каждой записи'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', help='Файл журнала; по умолчанию SLOW_QUERY_LOG'
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--order', choices=ORDERS, default='total')
+        parser.add_argument(
+            '--view', help='Только запросы этого представления'
+        )
+
+    def handle(self, *args, log, limit, order, view, **options):
+        path = log or slow_queries.log_path()
+        if not path:
+            raise CommandError('Журнал медленных запросов выключен')
+        shapes = {}
+        for record in slow_queries.read_log(path):
+            if view and record.get('view') != view:
+                continue
+            shape = shapes.setdefault(record['sql'], {
+                'samples': [],
+                'calls': 0,
+                'total': 0,
+                'sources': Counter(),
+            })
+            # При выборке в журнал попадает доля rate запросов, поэтому
+            # каждая запись стоит 1 / rate вызовов
+            weight = 1 / (record.get('rate') or 1)
+            shape['samples'].append(record['ms'])
+            shape['calls'] += weight
+            shape['total'] += record['ms'] * weight
+            shape['sources'][(
+                record.get('view'),
+                record.get('caller'),
+                record.get('template'),
+            )] += 1
+        if not shapes:
+            self.stdout.write('Медленных запросов нет')
+            return
+        report = []
+        for sql, shape in shapes.items():
+            report.append({
+                'sql': sql,
+                'total': shape['total'],
+                'calls': shape['calls'],
+                'p95': percentile(shape['samples'], 95),
+                'sources': shape['sources'],
+            })
+        report.sort(key=lambda row: row[order], reverse=True)
+        for rank, row in enumerate(report[:limit], 1):
+            self.stdout.write(
+                f'{rank}. всего {row["total"]:.1f} мс, '
+                f'вызовов {row["calls"]:.0f}, p95 {row["p95"]:.1f} мс'
+            )
+            for (source_view, caller, template), amount in (
+                row['sources'].most_common(3)
+            ):
+                where = ', '.join(
+                    part for part in (source_view, caller, template) if part
+                )
+                self.stdout.write(f'   {amount} x {where or "-"}')
+            self.stdout.write(f'   {row["sql"]}')
@@ -0,0 +1,357 @@
+"""Метрики сайта в текстовом формате Prometheus.
+
+Каждый процесс копит значения у себя в словарях; блокировка берётся
+только на само обновление числа. Раз в METRICS_FLUSH_INTERVAL секунд
+процесс целиком переписывает свой снимок в файл в METRICS_DIR (через
+os.replace, поэтому читатель не видит половину файла). Страница
+core:metrics складывает снимки всех процессов: воркеров сервера и
+процессов, которые строят миниатюры. Снимки завершившихся процессов
+при каждом чтении сливаются в archive.json, чтобы счётчики не
+уменьшались, а число файлов не росло с каждым перезапуском воркера:
+в каталоге остаются снимки живых процессов и архив. Очистка каталога
+при выкладке обнуляет метрики. Без METRICS_DIR видны только метрики
+текущего процесса.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: снимки не сливаются, только читаются
+    fcntl = None
+
+from django.conf import settings
+from django.templatetags.cache import CacheNode
+from django.template.base import NodeList
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Границы корзин гистограмм времени, в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    'yatube_http_requests_total': (
+        'counter', 'Ответы по представлению, методу и статусу'
+    ),
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время ответа по представлению'
+    ),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы по представлению'
+    ),
+    'yatube_db_query_duration_seconds_total': (
+        'counter', 'Суммарное время SQL-запросов по представлению'
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кэшу фрагментов и страниц'
+    ),
+    'yatube_thumbnail_duration_seconds': (
+        'histogram', 'Время построения миниатюры по размеру'
+    ),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = 0.0
+# Имя снимка не совпадёт у процессов с повторно выданным pid
+_process_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+ARCHIVE = 'archive.json'
+_local = threading.local()
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(metric, amount=1, **labels):
+    key = (metric, _key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(metric, value, **labels):
+    key = (metric, _key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            # Счётчики по корзинам, затем сумма и количество
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[index] += 1
+                break
+        histogram[-2] += value
+        histogram[-1] += 1
+    _maybe_flush()
+
+
+def count_cache(cache, name, hit):
+    inc(
+        'yatube_cache_requests_total',
+        cache=cache, name=name, result='hit' if hit else 'miss'
+    )
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [
+                [name, labels, value]
+                for (name, labels), value in _counters.items()
+            ],
+            'histograms': [
+                [name, labels, list(histogram)]
+                for (name, labels), histogram in _histograms.items()
+            ],
+        }
+
+
+def flush():
+    """Записывает снимок процесса в METRICS_DIR."""
+    global _last_flush
+    directory = _metrics_dir()
+    _last_flush = time.monotonic()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{_process_id}.json')
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as file_obj:
+        json.dump(_snapshot(), file_obj)
+    os.replace(temporary, path)
+
+
+def _maybe_flush():
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+    if time.monotonic() - _last_flush >= interval:
+        flush()
+
+
+def _read(path):
+    try:
+        with open(path) as file_obj:
+            return json.load(file_obj)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _locked(directory, mode):
+    # Слияние держит блокировку на запись, чтение - на чтение: иначе
+    # читатель увидел бы снимок и в архиве, и в исходном файле
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        fcntl.flock(descriptor, mode)
+        yield
+    finally:
+        os.close(descriptor)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю
+        return True
+    return True
+
+
+def _dead_files(directory):
+    # Снимки и брошенные временные файлы вида <pid>-<uuid>.json*
+    dead = []
+    for entry in os.scandir(directory):
+        pid = entry.name.split('-', 1)[0]
+        if not entry.name.endswith(('.json', '.tmp')) or not pid.isdigit():
+            continue
+        if not _is_alive(int(pid)):
+            dead.append(entry.path)
+    return dead
+
+
+def compact():
+    """Сливает снимки завершившихся процессов в архив METRICS_DIR.
+
+    Возвращает число слитых файлов.
+    """
+    directory = _metrics_dir()
+    if not directory or fcntl is None:
+        return 0
+    os.makedirs(directory, exist_ok=True)
+    if not _dead_files(directory):
+        return 0
+    with _locked(directory, fcntl.LOCK_EX):
+        # Пока ждали блокировку, файлы мог слить другой процесс
+        dead = _dead_files(directory)
+        if not dead:
+            return 0
+        archive = os.path.join(directory, ARCHIVE)
+        snapshots = [
+            snapshot for snapshot in map(_read, [archive] + dead)
+            if snapshot is not None
+        ]
+        counters, histograms = _merge(snapshots)
+        temporary = f'{archive}.{_process_id}.tmp'
+        with open(temporary, 'w') as file_obj:
+            json.dump({
+                'counters': [
+                    [name, labels, value]
+                    for (name, labels), value in counters.items()
+                ],
+                'histograms': [
+                    [name, labels, values]
+                    for (name, labels), values in histograms.items()
+                ],
+            }, file_obj)
+        os.replace(temporary, archive)
+        for path in dead:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+    return len(dead)
+
+
+def _snapshots():
+    directory = _metrics_dir()
+    if not directory:
+        return [_snapshot()]
+    flush()
+    compact()
+    if fcntl is None:
+        return _read_snapshots(directory)
+    with _locked(directory, fcntl.LOCK_SH):
+        return _read_snapshots(directory)
+
+
+def _read_snapshots(directory):
+    snapshots = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith('.json'):
+            continue
+        snapshot = _read(entry.path)
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _merge(snapshots):
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            if len(values) != len(BUCKETS) + 2:
+                # Снимок записан с другими границами корзин
+                continue
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                total[index] += value
+    return counters, histograms
+
+
+def collect():
+    """Складывает снимки всех процессов."""
+    return _merge(_snapshots())
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs
+    ) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(
+                        f'{name}{_labels(labels)} {_number(value)}'
+                    )
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, amount in zip(BUCKETS, values):
+                cumulative += amount
+                lines.append(
+                    f'{name}_bucket{_labels(labels, le=bound)} {cumulative}'
+                )
+            lines.append(
+                f'{name}_bucket{_labels(labels, le="+Inf")} {values[-1]}'
+            )
+            lines.append(f'{name}_sum{_labels(labels)} {_number(values[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Очищает метрики текущего процесса (для тестов)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+class _MissNodeList(NodeList):
+    # Содержимое {% cache %} рендерится только при промахе
+    def render(self, context):
+        _local.fragment_miss = True
+        return super().render(context)
+
+
+def _counted_render(render):
+    def wrapper(self, context):
+        if not isinstance(self.nodelist, _MissNodeList):
+            nodelist = _MissNodeList(self.nodelist)
+            nodelist.contains_nontext = self.nodelist.contains_nontext
+            self.nodelist = nodelist
+        outer = getattr(_local, 'fragment_miss', False)
+        _local.fragment_miss = False
+        try:
+            value = render(self, context)
+            hit = not _local.fragment_miss
+            count_cache('fragment', self.fragment_name, hit)
+            return value
+        finally:
+            _local.fragment_miss = outer
+    wrapper.metrics_wrapper = True
+    return wrapper
+
+
+def install_fragment_counter():
+    if not getattr(CacheNode.render, 'metrics_wrapper', False):
+        CacheNode.render = _counted_render(CacheNode.render)
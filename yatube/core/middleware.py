@@ -0,0 +1,234 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import metrics, page_cache, profiling, slow_queries
+from .queries import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@contextmanager
+def recording(request):
+    """Общий QueryRecorder запроса.
+
+    Первый middleware ставит единственную обёртку execute_wrapper,
+    остальные получают тот же учёт и при нужде добавляют слушателей:
+    так каждый SQL-запрос проходит одну обёртку, а не по одной на
+    middleware.
+    """
+    recorder = getattr(request, '_query_recorder', None)
+    if recorder is not None:
+        yield recorder
+        return
+    recorder = request._query_recorder = QueryRecorder()
+    try:
+        with connection.execute_wrapper(recorder):
+            yield recorder
+    finally:
+        del request._query_recorder
+
+
+class MetricsMiddleware:
+    """Пишет в core.metrics время, статус и SQL каждого ответа.
+
+    Стоит первым, чтобы время включало все остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install_fragment_counter()
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with recording(request) as recorder:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        # Адреса без маршрута не плодят отдельных меток
+        view_name = match.view_name if match else 'unmatched'
+        metrics.inc(
+            'yatube_http_requests_total',
+            view=view_name,
+            method=request.method,
+            status=response.status_code
+        )
+        metrics.observe(
+            'yatube_http_request_duration_seconds', duration, view=view_name
+        )
+        metrics.inc(
+            'yatube_db_queries_total', recorder.count, view=view_name
+        )
+        metrics.inc(
+            'yatube_db_query_duration_seconds_total',
+            recorder.duration,
+            view=view_name
+        )
+        return response
+
+
+def _shows_queries(request):
+    if settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого запроса и сверяет их с бюджетом.
+
+    Бюджеты задаются в settings.QUERY_BUDGETS по имени URL
+    ('posts:post_detail': 5). При QUERY_BUDGET_STRICT превышение
+    бюджета поднимает исключение, иначе пишется предупреждение в лог.
+    Число и время запросов в заголовках ответа видны только при DEBUG
+    и сотрудникам: остальным они подсказали бы, какие страницы дороги.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with recording(request) as recorder:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        repeated = recorder.repeated(
+            getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+        )
+        if _shows_queries(request):
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time'] = f'{recorder.duration * 1000:.1f}ms'
+        logger.info(
+            '%s %s view=%s queries=%d time=%.1fms repeated=%d',
+            request.method, request.path, view_name,
+            recorder.count, recorder.duration * 1000, len(repeated)
+        )
+        for sql, amount in repeated.items():
+            logger.warning('%s: %d x %s', view_name, amount, sql)
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+        if budget is not None and recorder.count > budget:
+            message = (
+                f'{view_name}: {recorder.count} SQL-запросов '
+                f'при бюджете {budget}'
+            )
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class SlowQueryMiddleware:
+    """Пишет медленные SQL-запросы в журнал core.slow_queries."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        path = slow_queries.log_path()
+        if not path:
+            return self.get_response(request)
+        logger = slow_queries.SlowQueryLogger(request, path)
+        with recording(request) as recorder:
+            recorder.listeners.append(logger.observe)
+            try:
+                return self.get_response(request)
+            finally:
+                recorder.listeners.remove(logger.observe)
+
+
+class ProfilerMiddleware:
+    """Профилирует запросы с подписанным X-Profile или ?_profile=1.
+
+    Флаг в строке запроса действует только для сотрудников, поэтому
+    middleware стоит после AuthenticationMiddleware. Снимки пишутся в
+    settings.PROFILE_DIR, список доступен на странице core:profiles.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        profiling.install_template_timer()
+
+    def __call__(self, request):
+        if not profiling.wants_profile(request):
+            return self.get_response(request)
+        request.profiling = True
+        capture = profiling.Capture(request)
+        with connection.execute_wrapper(capture), capture:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        response['X-Profile-Id'] = capture.save(
+            match.view_name if match else None, response.status_code
+        )
+        return response
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимным читателям готовые страницы из кэша.
+
+    Кэшируются только представления из settings.PAGE_CACHE_VIEWS.
+    Страницы сбрасываются через core.page_cache.purge() и purge_tags()
+    при записи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, '_page_cache_key', None)
+        if (
+            key is not None
+            and response.status_code == 200
+            and not response.cookies
+            and not getattr(response, 'streaming', False)
+        ):
+            tags = getattr(request, '_page_cache_tags', ())
+            cache.set(
+                key,
+                (response, page_cache.tag_versions(tags)),
+                getattr(settings, 'PAGE_CACHE_TTL', 300)
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if not page_cache.is_anonymous(request):
+            return None
+        if getattr(request, 'profiling', False):
+            return None
+        view_name = request.resolver_match.view_name
+        if view_name not in getattr(settings, 'PAGE_CACHE_VIEWS', ()):
+            return None
+        key = page_cache.page_key(request)
+        response = None
+        entry = cache.get(key)
+        if entry is not None:
+            response, versions = entry
+            if versions and page_cache.tag_versions(versions) != versions:
+                # Один из тегов страницы сброшен после сохранения
+                response = None
+        page_cache.count(hit=response is not None)
+        metrics.count_cache('page', view_name, response is not None)
+        if response is None:
+            request._page_cache_key = key
+            return None
+        response['X-Page-Cache'] = 'hit'
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(
+                response.get('Last-Modified', '')
+            ),
+            response=response,
+        )
@@ -0,0 +1,85 @@
+"""Кэш целых страниц для анонимных читателей.
+
+Ключ страницы включает путь, строку запроса, язык и версию пути.
+purge() увеличивает версию пути, поэтому сбрасываются сразу все
+варианты страницы (разные курсоры и ?page=N), а остальные пути
+остаются в кэше.
+
+Представление может пометить страницу тегами через tag_page(): вместе
+со страницей сохраняются версии её тегов, и purge_tags() сбрасывает
+все страницы с тегом, даже если их адреса заранее не известны.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import get_language
+
+HITS_KEY = 'core:page_cache:hits'
+MISSES_KEY = 'core:page_cache:misses'
+
+
+def _version_key(path):
+    return 'core:page_cache:version:' + hashlib.md5(path.encode()).hexdigest()
+
+
+def _tag_key(tag):
+    return 'core:page_cache:tag:' + hashlib.md5(tag.encode()).hexdigest()
+
+
+def _path_version(path):
+    return cache.get(_version_key(path), 0)
+
+
+def page_key(request):
+    path = request.path
+    query = request.GET.urlencode()
+    raw = f'{path}?{query}|{get_language()}|{_path_version(path)}'
+    return 'core:page_cache:entry:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def is_anonymous(request):
+    """Запрос без сессии и CSRF-куки можно отдать из общего кэша."""
+    return not (
+        settings.SESSION_COOKIE_NAME in request.COOKIES
+        or settings.CSRF_COOKIE_NAME in request.COOKIES
+    )
+
+
+def _incr(key):
+    if cache.add(key, 1, None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def purge(*paths):
+    for path in paths:
+        _incr(_version_key(path))
+
+
+def tag_page(request, *tags):
+    request._page_cache_tags = getattr(request, '_page_cache_tags', ()) + tags
+
+
+def tag_versions(tags):
+    versions = cache.get_many([_tag_key(tag) for tag in tags])
+    return {tag: versions.get(_tag_key(tag), 0) for tag in tags}
+
+
+def purge_tags(*tags):
+    for tag in tags:
+        _incr(_tag_key(tag))
+
+
+def count(hit):
+    _incr(HITS_KEY if hit else MISSES_KEY)
+
+
+def stats():
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+    }
@@ -0,0 +1,290 @@
+"""Профилирование отдельных запросов по требованию.
+
+Запрос профилируется, если в нём есть подписанный заголовок
+X-Profile (одноразовый токен выдаёт ``manage.py profile_token``) или,
+для сотрудников, параметр ?_profile=1. Параметр убирается из запроса до
+представления, чтобы не попасть в ссылки страницы и ключи кэша. Для
+такого запроса сохраняются:
+
+* ``<имя>.pstats`` - статистика cProfile для pstats/snakeviz;
+* ``<имя>.collapsed`` - стеки в формате flamegraph.pl/speedscope;
+* ``<имя>.json`` - сводка: время, SQL-запросы, время шаблонов.
+
+Остальные запросы платят только за проверку заголовка и флага.
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.template.base import Template
+from django.utils import timezone
+
+from .queries import normalize_sql
+
+SALT = 'core.profiling'
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = '_profile'
+# Глубже этого стеки в .collapsed обрезаются
+MAX_STACK_DEPTH = 60
+# Сколько путей по графу вызовов обходится при сборке .collapsed
+MAX_STACK_NODES = 20000
+# Ветви, на которые приходится меньше микросекунды, не обходятся
+MIN_STACK_SECONDS = 1e-6
+EXTENSIONS = ('pstats', 'collapsed', 'json')
+
+_local = threading.local()
+
+
+def profile_dir():
+    return getattr(
+        settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')
+    )
+
+
+def _max_age():
+    return getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 60 * 60)
+
+
+def make_token():
+    return signing.dumps({'nonce': uuid.uuid4().hex}, salt=SALT)
+
+
+def _valid_token(token):
+    try:
+        data = signing.loads(token, salt=SALT, max_age=_max_age())
+    except signing.BadSignature:
+        return False
+    nonce = data.get('nonce') if isinstance(data, dict) else None
+    # Токен одноразовый: перехваченный заголовок не даст профилировать
+    # сайт повторно. Отметка живёт не дольше самого токена
+    return bool(nonce) and cache.add(
+        f'core:profile-token:{nonce}', 1, _max_age()
+    )
+
+
+def wants_profile(request):
+    flag = request.GET.get(QUERY_FLAG)
+    if flag is not None:
+        request.GET = request.GET.copy()
+        del request.GET[QUERY_FLAG]
+        request.META['QUERY_STRING'] = request.GET.urlencode()
+    token = request.META.get(HEADER)
+    if token:
+        return _valid_token(token)
+    user = getattr(request, 'user', None)
+    return flag == '1' and user is not None and user.is_staff
+
+
+def _timed_render(render):
+    # Шаблоны замеряются, только если поток сейчас профилируется
+    def wrapper(self, context):
+        capture = getattr(_local, 'capture', None)
+        if capture is None:
+            return render(self, context)
+        start = time.perf_counter()
+        capture.depth += 1
+        try:
+            return render(self, context)
+        finally:
+            capture.depth -= 1
+            duration = time.perf_counter() - start
+            capture.templates.append(
+                (self.origin.template_name or self.origin.name, duration)
+            )
+            if not capture.depth:
+                capture.template_time += duration
+    wrapper.profiling_wrapper = True
+    return wrapper
+
+
+def install_template_timer():
+    if not getattr(Template._render, 'profiling_wrapper', False):
+        Template._render = _timed_render(Template._render)
+
+
+class Capture:
+    """Данные одного профилируемого запроса."""
+
+    def __init__(self, request):
+        self.request = request
+        self.profile = cProfile.Profile()
+        self.queries = []
+        # (шаблон, время) включая вложенные; template_time - только
+        # внешние шаблоны, чтобы не считать extends и include дважды
+        self.templates = []
+        self.template_time = 0.0
+        self.depth = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        _local.capture = self
+        self.started = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        self.duration = time.perf_counter() - self.started
+        _local.capture = None
+
+    def summary(self, view_name, status_code):
+        shapes = {}
+        for sql, duration in self.queries:
+            shape = shapes.setdefault(
+                normalize_sql(sql), {'calls': 0, 'time_ms': 0.0}
+            )
+            shape['calls'] += 1
+            shape['time_ms'] += duration * 1000
+        return {
+            'path': self.request.get_full_path(),
+            'method': self.request.method,
+            'view': view_name,
+            'status': status_code,
+            'created': time.time(),
+            'duration_ms': self.duration * 1000,
+            'sql_count': len(self.queries),
+            'sql_time_ms': sum(d for _, d in self.queries) * 1000,
+            'sql': sorted(
+                ({'sql': sql, **data} for sql, data in shapes.items()),
+                key=lambda item: -item['time_ms']
+            ),
+            'template_time_ms': self.template_time * 1000,
+            'templates': [
+                {'name': name, 'time_ms': duration * 1000}
+                for name, duration in self.templates
+            ],
+        }
+
+    def save(self, view_name, status_code):
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        name = '{}-{}-{}'.format(
+            time.strftime('%Y%m%d-%H%M%S'),
+            (view_name or 'unknown').replace(':', '.'),
+            uuid.uuid4().hex[:6],
+        )
+        base = os.path.join(directory, name)
+        self.profile.dump_stats(base + '.pstats')
+        stats = pstats.Stats(self.profile)
+        with open(base + '.collapsed', 'w') as file_obj:
+            for stack, micros in collapsed_stacks(stats):
+                file_obj.write(f'{stack} {micros}\n')
+        with open(base + '.json', 'w', encoding='utf-8') as file_obj:
+            json.dump(
+                self.summary(view_name, status_code),
+                file_obj, ensure_ascii=False
+            )
+        prune(getattr(settings, 'PROFILE_KEEP', 200))
+        return name
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        # Встроенные функции cProfile записывает без файла
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def collapsed_stacks(stats):
+    """Стеки для flame graph из графа вызовов cProfile.
+
+    cProfile хранит только пары «вызывающий - вызываемый», поэтому
+    собственное время функции делится между путями к ней пропорционально
+    накопленному времени по каждому ребру - так же делают flameprof и
+    gprof2dot. Число путей в графе растёт экспоненциально с глубиной,
+    поэтому обход не спускается в ветви короче MIN_STACK_SECONDS и
+    останавливается после MAX_STACK_NODES путей. Результат: пары (стек
+    через «;», микросекунды).
+    """
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [
+        func for func, data in stats.stats.items() if not data[4]
+    ]
+    result = {}
+    visited = 0
+
+    def walk(func, share, path):
+        nonlocal visited
+        cc, nc, tt, ct, callers = stats.stats[func]
+        if ct * share < MIN_STACK_SECONDS or visited >= MAX_STACK_NODES:
+            return
+        visited += 1
+        path = path + [_label(func)]
+        own = tt * share
+        if own > 0:
+            key = ';'.join(path)
+            result[key] = result.get(key, 0) + own
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_time in callees.get(func, ()):
+            total = stats.stats[callee][3]
+            if callee in stack_set or total <= 0:
+                continue
+            stack_set.add(callee)
+            walk(callee, share * edge_time / total, path)
+            stack_set.discard(callee)
+
+    for root in roots:
+        stack_set = {root}
+        walk(root, 1.0, [])
+    return [
+        (stack, int(seconds * 1_000_000))
+        for stack, seconds in result.items()
+        if seconds * 1_000_000 >= 1
+    ]
+
+
+def _summaries():
+    try:
+        entries = [
+            entry for entry in os.scandir(profile_dir())
+            if entry.name.endswith('.json')
+        ]
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+    return entries
+
+
+def captures(limit=50):
+    """Сводки последних снимков, от новых к старым."""
+    result = []
+    for entry in _summaries()[:limit]:
+        with open(entry.path, encoding='utf-8') as file_obj:
+            summary = json.load(file_obj)
+        summary['name'] = entry.name[:-len('.json')]
+        summary['created'] = datetime.fromtimestamp(
+            summary['created'], tz=timezone.utc
+        )
+        result.append(summary)
+    return result
+
+
+def prune(keep):
+    """Удаляет самые старые снимки сверх keep."""
+    for entry in _summaries()[keep:]:
+        name = entry.name[:-len('.json')]
+        for extension in EXTENSIONS:
+            try:
+                os.remove(os.path.join(profile_dir(), f'{name}.{extension}'))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,51 @@
+"""Учёт SQL-запросов, выполненных в рамках одного запроса к сайту."""
+import re
+import time
+from collections import Counter
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Форма запроса без литералов: запросы с разными id совпадут."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """Обёртка для connection.execute_wrapper, запоминающая запросы.
+
+    Слушатели из listeners получают текст и длительность каждого запроса
+    в секундах: так несколько middleware обходятся одной обёрткой.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.listeners = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.duration += duration
+            self.count += 1
+            self.shapes[normalize_sql(sql)] += 1
+            for listener in self.listeners:
+                listener(sql, duration)
+
+    def repeated(self, threshold):
+        """Формы запросов, повторившиеся не меньше threshold раз."""
+        return {
+            sql: amount for sql, amount in self.shapes.items()
+            if amount >= threshold
+        }
@@ -0,0 +1,176 @@
+"""Журнал медленных SQL-запросов.
+
+Запросы дольше SLOW_QUERY_THRESHOLD_MS (из них доля
+SLOW_QUERY_SAMPLE_RATE) пишутся строками JSON. Каждый процесс пишет в
+свой файл SLOW_QUERY_LOG.<pid> и сам ротирует его по размеру:
+RotatingFileHandler не знает о других процессах, и с общим файлом
+воркеры переименовывали бы его друг у друга. Литералы из текста запроса
+убираются, параметры не пишутся вовсе. У каждой записи есть
+представление, строка кода проекта, откуда пришёл запрос, строка
+шаблона, если запрос случился во время рендеринга, и доля выборки.
+Отчёт по всем файлам строит ``manage.py slowqueries``.
+"""
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.utils import timezone
+
+from .queries import normalize_sql
+
+_handlers = {}
+_handlers_lock = threading.Lock()
+_CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def log_path():
+    return getattr(settings, 'SLOW_QUERY_LOG', None)
+
+
+def process_log(path, pid=None):
+    return f'{path}.{pid or os.getpid()}'
+
+
+def log_files(path):
+    """Файлы журнала всех процессов с ротированными копиями.
+
+    Порядок - по времени последней записи, от старых к новым.
+    """
+    names = [path] + glob.glob(glob.escape(path) + '.*')
+    files = []
+    for name in names:
+        try:
+            files.append((os.path.getmtime(name), name))
+        except OSError:
+            # Файл ротировали между glob и stat
+            continue
+    return [name for _, name in sorted(files)]
+
+
+def _handler(path):
+    # Ключ с pid: после fork потомок открывает свой файл, а не пишет в
+    # унаследованный от родителя
+    key = (path, os.getpid())
+    handler = _handlers.get(key)
+    if handler is None:
+        with _handlers_lock:
+            handler = _handlers.get(key)
+            if handler is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                handler = RotatingFileHandler(
+                    process_log(path),
+                    maxBytes=getattr(
+                        settings, 'SLOW_QUERY_LOG_BYTES', 10 * 1024 ** 2
+                    ),
+                    backupCount=getattr(settings, 'SLOW_QUERY_LOG_BACKUPS', 5),
+                    encoding='utf-8',
+                    delay=True,
+                )
+                _handlers[key] = handler
+    return handler
+
+
+def close_logs():
+    with _handlers_lock:
+        for handler in _handlers.values():
+            handler.close()
+        _handlers.clear()
+
+
+def _project_frame(frame):
+    # Ближайшая к запросу строка кода проекта, кроме самого core
+    root = os.path.abspath(settings.BASE_DIR)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (
+            filename.startswith(root)
+            and not filename.startswith(_CORE_DIR)
+            and 'site-packages' not in filename
+        ):
+            return '{}:{} in {}'.format(
+                os.path.relpath(filename, root),
+                frame.f_lineno,
+                frame.f_code.co_name,
+            )
+        frame = frame.f_back
+    return None
+
+
+def _template_line(frame):
+    # Node.render_annotated - последний кадр с узлом шаблона
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                return '{}:{}'.format(
+                    origin.template_name or origin.name, token.lineno
+                )
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryLogger:
+    """Журнал медленных запросов на время одного запроса к сайту.
+
+    Работает и как обёртка для connection.execute_wrapper, и как
+    слушатель core.queries.QueryRecorder.
+    """
+
+    def __init__(self, request, path):
+        self.request = request
+        self.handler = _handler(path)
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100)
+        self.sample_rate = getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', 1.0)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.observe(sql, time.perf_counter() - start)
+
+    def observe(self, sql, seconds):
+        """Слушатель для core.queries.QueryRecorder."""
+        duration = seconds * 1000
+        if duration >= self.threshold and random.random() < self.sample_rate:
+            self.write(sql, duration)
+
+    def write(self, sql, duration):
+        match = getattr(self.request, 'resolver_match', None)
+        # Поиск кода проекта и шаблона идёт вверх по стеку, так что
+        # начать можно с любого кадра обёрток
+        frame = sys._getframe(1)
+        record = {
+            'time': timezone.now().isoformat(),
+            'ms': round(duration, 3),
+            'sql': normalize_sql(sql),
+            'view': match.view_name if match else None,
+            'path': self.request.path,
+            'caller': _project_frame(frame),
+            'template': _template_line(frame),
+            'rate': self.sample_rate,
+        }
+        self.handler.handle(logging.makeLogRecord(
+            {'msg': json.dumps(record, ensure_ascii=False)}
+        ))
+
+
+def read_log(path):
+    """Записи журналов всех процессов вместе с ротированными копиями."""
+    for name in log_files(path):
+        with open(name, encoding='utf-8') as file_obj:
+            for line in file_obj:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Строка, оборванная при ротации или падении процесса
+                    continue
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты падают, если страница выходит за бюджет SQL-запросов.
+
+    Журнал медленных запросов выключен: тесты, которым он нужен, задают
+    свой файл во временном каталоге, а не пишут в дерево проекта.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
+        settings.SLOW_QUERY_LOG = None
@@ -1,6 +1,32 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 from http import HTTPStatus
+from io import StringIO
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Engine
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+from . import metrics, page_cache, profiling, slow_queries
+from .middleware import (
+    MetricsMiddleware, QueryBudgetExceeded, QueryBudgetMiddleware,
+    SlowQueryMiddleware
+)
+from .queries import normalize_sql
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +34,417 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(author=author, text='test-text')
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_query_count_header(self):
+        self.client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Query-Count'], '4')
+        self.assertIn('X-Query-Time', response)
+
+    def test_query_count_header_is_hidden_from_readers(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('X-Query-Count', response)
+        self.assertNotIn('X-Query-Time', response)
+        with self.settings(DEBUG=True):
+            response = self.client.get(self.url)
+        self.assertIn('X-Query-Count', response)
+
+    def test_budget_is_strict_in_tests(self):
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+
+    @override_settings(
+        QUERY_BUDGETS={'posts:post_detail': 1},
+        QUERY_BUDGET_STRICT=True
+    )
+    def test_strict_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(self.url)
+
+    def test_middleware_share_one_wrapper(self):
+        wrappers = []
+
+        def view(request):
+            wrappers.append(len(connection.execute_wrappers))
+            return HttpResponse(Post.objects.count())
+
+        handler = MetricsMiddleware(
+            QueryBudgetMiddleware(SlowQueryMiddleware(view))
+        )
+        with self.settings(DEBUG=True):
+            response = handler(RequestFactory().get('/'))
+        self.assertEqual(wrappers, [1])
+        self.assertEqual(response['X-Query-Count'], '1')
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql(
+                "SELECT * FROM t WHERE id IN (%s, %s)  AND name = 'x' "
+                "LIMIT 21"
+            ),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?'
+        )
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        Post.objects.create(author=cls.author, text='test-text')
+        cls.url = reverse('posts:profile', kwargs={'username': 'NoName'})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_is_cached(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual(page_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_session_cookie_skips_cache(self):
+        self.client.get(self.url)
+        self.client.force_login(self.author)
+        response = self.client.get(self.url)
+        self.assertNotIn('X-Page-Cache', response)
+
+    def test_new_post_purges_author_pages_only(self):
+        index_url = reverse('posts:index')
+        self.client.get(self.url)
+        self.client.get(index_url)
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='test-new-post')
+        self.assertContains(self.client.get(index_url), 'test-new-post')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'hit')
+
+    def test_moved_post_purges_previous_group(self):
+        cats = Group.objects.create(title='Кошки', slug='cats')
+        dogs = Group.objects.create(title='Собаки', slug='dogs')
+        post = Post.objects.create(
+            author=self.author, group=cats, text='test-moved-post'
+        )
+        url = reverse('posts:group_posts', kwargs={'slug': cats.slug})
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+        post.group = dogs
+        post.save()
+        self.assertNotContains(self.client.get(url), 'test-moved-post')
+
+    def test_new_post_purges_other_posts_of_author(self):
+        post = Post.objects.get(author=self.author)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+        Post.objects.create(author=self.author, text='test-new-post')
+        self.assertNotIn('X-Page-Cache', self.client.get(url))
+
+
+PROFILE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(PROFILE_DIR=PROFILE_DIR)
+class ProfilerMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(author=cls.author, text='test-text')
+        cls.url = reverse('posts:index')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(PROFILE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(PROFILE_DIR, ignore_errors=True)
+
+    def test_staff_flag_saves_capture(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'_profile': '1'})
+        name = response['X-Profile-Id']
+        for extension in profiling.EXTENSIONS:
+            self.assertTrue(os.path.exists(
+                os.path.join(PROFILE_DIR, f'{name}.{extension}')
+            ))
+        capture, = profiling.captures()
+        self.assertEqual(capture['view'], 'posts:index')
+        self.assertGreater(capture['sql_count'], 0)
+        self.assertIn(
+            'posts/index.html',
+            [template['name'] for template in capture['templates']]
+        )
+        with open(os.path.join(PROFILE_DIR, f'{name}.collapsed')) as file:
+            stack, micros = file.readline().rsplit(' ', 1)
+        self.assertGreater(int(micros), 0)
+        response = self.client.get(reverse('core:profiles'))
+        self.assertContains(response, name)
+
+    def test_flag_is_ignored_for_readers(self):
+        self.client.force_login(self.author)
+        response = self.client.get(self.url, {'_profile': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.client.get(reverse('core:profiles'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_signed_header(self):
+        response = self.client.get(
+            self.url, HTTP_X_PROFILE=profiling.make_token()
+        )
+        self.assertIn('X-Profile-Id', response)
+        response = self.client.get(self.url, HTTP_X_PROFILE='forged')
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_token_is_single_use(self):
+        token = profiling.make_token()
+        response = self.client.get(self.url, HTTP_X_PROFILE=token)
+        self.assertIn('X-Profile-Id', response)
+        response = self.client.get(self.url, HTTP_X_PROFILE=token)
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_flag_is_hidden_from_view(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'_profile': '1', 'page': '1'})
+        self.assertNotIn('_profile', response.wsgi_request.GET)
+        self.assertEqual(
+            response.wsgi_request.get_full_path(), f'{self.url}?page=1'
+        )
+        capture, = profiling.captures()
+        self.assertEqual(capture['path'], f'{self.url}?page=1')
+
+    def test_collapsed_stacks_of_dense_graph(self):
+        # Каждый уровень вызывает обе функции следующего: 2 ** 40 путей
+        levels = 40
+        graph = {}
+        for level in range(levels):
+            for side in range(2):
+                callers = {}
+                if level:
+                    for parent in range(2):
+                        callers[('f.py', level - 1, f'{parent}')] = (
+                            1, 1, 0.0, 2.0 ** (levels - level) / 2
+                        )
+                graph[('f.py', level, f'{side}')] = (
+                    1, 1, 1.0, 2.0 ** (levels - level), callers
+                )
+        stats = type('Stats', (), {'stats': graph})
+        stacks = profiling.collapsed_stacks(stats)
+        self.assertTrue(stacks)
+        self.assertLessEqual(len(stacks), profiling.MAX_STACK_NODES)
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_old_captures_are_pruned(self):
+        for _ in range(3):
+            self.client.get(self.url, HTTP_X_PROFILE=profiling.make_token())
+        self.assertEqual(len(profiling.captures()), 2)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.staff_client = Client()
+        cls.staff_client.force_login(cls.staff)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def scrape(self):
+        response = self.staff_client.get(reverse('core:metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        self.client.force_login(self.reader)
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.scrape()
+        self.assertIn(
+            'yatube_http_requests_total{method="GET",status="200",'
+            'view="posts:index"} 2',
+            text
+        )
+        self.assertIn(
+            'yatube_http_request_duration_seconds_count'
+            '{view="posts:index"} 2',
+            text
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', text)
+        self.assertIn(
+            'yatube_cache_requests_total{cache="fragment",'
+            'name="index_page",result="miss"} 1',
+            text
+        )
+        self.assertIn(
+            'yatube_cache_requests_total{cache="fragment",'
+            'name="index_page",result="hit"} 1',
+            text
+        )
+
+    def test_endpoint_requires_staff_or_token(self):
+        url = reverse('core:metrics')
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        with self.settings(METRICS_TOKEN='secret'):
+            response = Client().get(url, HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            response = Client().get(url, HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_snapshots_of_processes_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = [0] * (len(metrics.BUCKETS) + 2)
+        other[0], other[-2], other[-1] = 1, 0.001, 1
+        with open(os.path.join(directory, 'other.json'), 'w') as file:
+            json.dump({
+                'counters': [],
+                'histograms': [[
+                    'yatube_thumbnail_duration_seconds',
+                    [['geometry', '320x113']],
+                    other,
+                ]],
+            }, file)
+        with self.settings(METRICS_DIR=directory):
+            metrics.observe(
+                'yatube_thumbnail_duration_seconds', 20, geometry='320x113'
+            )
+            text = self.scrape()
+        self.assertIn(
+            'yatube_thumbnail_duration_seconds_bucket'
+            '{geometry="320x113",le="0.005"} 1',
+            text
+        )
+        self.assertIn(
+            'yatube_thumbnail_duration_seconds_bucket'
+            '{geometry="320x113",le="+Inf"} 2',
+            text
+        )
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_snapshots_of_dead_processes_are_archived(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        finished = subprocess.Popen([sys.executable, '-c', ''])
+        finished.wait()
+        with open(
+            os.path.join(directory, f'{finished.pid}-dead.json'), 'w'
+        ) as file:
+            json.dump({
+                'counters': [[
+                    'yatube_db_queries_total', [['view', 'gone']], 3
+                ]],
+                'histograms': [],
+            }, file)
+        with self.settings(METRICS_DIR=directory):
+            for _ in range(2):
+                self.assertIn(
+                    'yatube_db_queries_total{view="gone"} 3', self.scrape()
+                )
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            sorted([metrics.ARCHIVE, f'{metrics._process_id}.json'])
+        )
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=cls.reader, text='test-text')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(slow_queries.close_logs)
+        self.log = os.path.join(directory, 'slow.log')
+        overrides = self.settings(
+            SLOW_QUERY_LOG=self.log, SLOW_QUERY_THRESHOLD_MS=0
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_statements_are_attributed(self):
+        self.client.force_login(self.reader)
+        self.client.get(reverse(
+            'posts:profile', kwargs={'username': self.reader.username}
+        ))
+        records = list(slow_queries.read_log(self.log))
+        self.assertTrue(records)
+        self.assertEqual(
+            {record['view'] for record in records}, {'posts:profile'}
+        )
+        self.assertNotIn('reader', ' '.join(r['sql'] for r in records))
+        self.assertTrue(any(
+            (record['caller'] or '').startswith('posts/views.py')
+            for record in records
+        ))
+
+    def test_template_line(self):
+        request = RequestFactory().get('/')
+        template = Engine().from_string('\n{{ posts.count }}')
+        logger = slow_queries.SlowQueryLogger(request, self.log)
+        with connection.execute_wrapper(logger):
+            template.render(Context({'posts': Post.objects.all()}))
+        record, = slow_queries.read_log(self.log)
+        self.assertEqual(record['template'], '<unknown source>:2')
+
+    def test_report(self):
+        self.client.force_login(self.reader)
+        for _ in range(2):
+            self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command('slowqueries', log=self.log, limit=3, stdout=out)
+        report = out.getvalue()
+        self.assertIn('1. всего', report)
+        self.assertIn('posts:index', report)
+        self.assertNotIn('4. всего', report)
+
+    def test_each_process_writes_own_file(self):
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(os.path.exists(self.log))
+        self.assertTrue(os.path.exists(slow_queries.process_log(self.log)))
+        # Файл другого процесса попадает в отчёт наравне со своим
+        record = {'ms': 5, 'sql': 'SELECT 1', 'view': 'other', 'rate': 1}
+        with open(slow_queries.process_log(self.log, 1), 'w') as file_obj:
+            file_obj.write(json.dumps(record) + '\n')
+        views = {record['view'] for record in slow_queries.read_log(self.log)}
+        self.assertEqual(views, {'posts:index', 'other'})
+
+    def test_report_scales_sampled_records(self):
+        with open(self.log, 'w') as file_obj:
+            for _ in range(2):
+                file_obj.write(json.dumps(
+                    {'ms': 10, 'sql': 'SELECT 1', 'rate': 0.1}
+                ) + '\n')
+        out = StringIO()
+        call_command('slowqueries', log=self.log, stdout=out)
+        self.assertIn('всего 200.0 мс, вызовов 20,', out.getvalue())
+
+    def test_threshold(self):
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=10 ** 6):
+            self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command('slowqueries', log=self.log, stdout=out)
+        self.assertIn('Медленных запросов нет', out.getvalue())
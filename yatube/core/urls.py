@@ -0,0 +1,15 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('profiles/', views.profiles, name='profiles'),
+    path(
+        'profiles/<str:name>.<str:extension>',
+        views.profile_file,
+        name='profile_file'
+    ),
+]
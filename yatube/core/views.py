@@ -1,7 +1,17 @@
+import hmac
+import os
+import re
 from http import HTTPStatus
 
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics, profiling
+
+PROFILE_NAME = re.compile(r'[\w.-]+')
+
 
 def page_not_found(request, exception):
     return render(
@@ -26,3 +36,42 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def profiles(request):
+    return render(
+        request,
+        'core/profiles.html',
+        {'captures': profiling.captures()}
+    )
+
+
+@staff_member_required
+def profile_file(request, name, extension):
+    if (
+        extension not in profiling.EXTENSIONS
+        or not PROFILE_NAME.fullmatch(name)
+    ):
+        raise Http404
+    path = os.path.join(profiling.profile_dir(), f'{name}.{extension}')
+    if not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True)
+
+
+def _scrape_token_ok(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def metrics_view(request):
+    if not _scrape_token_ok(request):
+        return _staff_metrics(request)
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@staff_member_required
+def _staff_metrics(request):
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
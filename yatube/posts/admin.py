@@ -1,8 +1,85 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
+
+from . import search
+from .forms import PostAdminForm
 from .models import Post, Group, Comment
+from .thumbnails import queue_thumbnails
+
+
+# Дальше этого числа строк отфильтрованный список не пересчитывается
+ADMIN_COUNT_LIMIT = 10000
+
+
+def estimated_rows(model):
+    """Примерное число строк таблицы без COUNT(*) по ней."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0])
+    # Максимальный ключ берётся из индекса за один шаг
+    return model._default_manager.aggregate(top=Max('pk'))['top'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор списков админки, не считающий всю таблицу.
+
+    Без фильтров число строк оценивается по статистике или наибольшему
+    ключу, с фильтрами - считается не дальше ADMIN_COUNT_LIMIT.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimated_rows(queryset.model)
+        return queryset.order_by()[:ADMIN_COUNT_LIMIT].count()
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class RowGroupWidget(ForeignKeyRawIdWidget):
+    """Id группы в строке списка постов.
 
+    Название группы у виджета raw_id ищется запросом на каждую строку;
+    здесь оно берётся из группы, уже выбранной вместе с постом.
+    """
 
-class PostAdmin(admin.ModelAdmin):
+    group = None
+
+    def label_and_url_for_value(self, value):
+        group = self.group
+        if group is None or str(group.pk) != str(value):
+            return super().label_and_url_for_value(value)
+        url = reverse(
+            f'{self.admin_site.name}:posts_group_change', args=[group.pk]
+        )
+        return Truncator(group).words(14), url
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class PostAdmin(ScalableAdmin):
+    form = PostAdminForm
     list_display = (
         'pk',
         'text',
@@ -11,11 +88,57 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    # Тот же порядок, что у индекса post_feed_idx
+    ordering = ('-pub_date', '-pk')
+    empty_value_display = '-пусто-'
+
+    def get_changelist_formset(self, request, **kwargs):
+        formset = super().get_changelist_formset(request, **kwargs)
+        # В строках списка группа задаётся по id: и select со всеми
+        # группами, и автодополнение стоили бы на каждой строке
+        formset.form.base_fields['group'].widget = RowGroupWidget(
+            Post._meta.get_field('group').remote_field, self.admin_site
+        )
+
+        class RowFormSet(formset):
+            def _construct_form(self, i, **kwargs):
+                form = super()._construct_form(i, **kwargs)
+                form.fields['group'].widget.group = form.instance.group
+                return form
+        return RowFormSet
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data and obj.image:
+            queue_thumbnails(obj.image.name)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идёт по тому же FTS5-индексу, что и на сайте, без LIKE
+        if not search_term or not search.is_available():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        if not search.match_expression(search_term):
+            return queryset.none(), False
+        return queryset.filter(
+            pk__in=RawSQL(*search.matching_sql(search_term))
+        ), False
+
+
+class CommentAdmin(ScalableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    raw_id_fields = ('author', 'post')
+    search_fields = ('text',)
+    ordering = ('-created', '-pk')
     empty_value_display = '-пусто-'
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
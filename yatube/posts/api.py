@@ -0,0 +1,239 @@
+"""Read-only JSON API лент, поста и комментариев.
+
+Сериализация написана вручную: для каждого поля заранее известны
+колонки для only() и функция, достающая значение, поэтому ответ
+собирается без обхода полей модели. ``?fields=text,author`` сужает и
+ответ, и сам SQL-запрос. Страницы листаются тем же курсором по
+(pub_date, id), что и HTML-ленты; ETag и Last-Modified тоже общие.
+"""
+from functools import wraps
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .conf import POSTS_COUNT
+from .feed_cache import (
+    author_feeds, conditional_feed, follow_feeds, group_feeds, index_feeds,
+    single_post_feeds,
+)
+from .models import Comment, Group, Post, User
+from .thumbnails import resolve_thumbnails
+from .timeline import TimelinePaginator
+from .utils import decode_cursor, encode_cursor, get_paginator
+
+
+def _image(post):
+    return post.image.url if post.image else None
+
+
+def _thumbnails(post):
+    # Пока миниатюры строятся, здесь исходная картинка, размер может
+    # быть неизвестен
+    return [
+        {
+            'url': thumb.url,
+            'width': thumb.width if thumb.size else None,
+            'height': thumb.height if thumb.size else None,
+        }
+        for thumb in post.thumbnails
+    ]
+
+
+# Поле ответа: (колонки для only(), связи для select_related, значение)
+POST_FIELDS = {
+    'id': ((), (), lambda post: post.pk),
+    'text': (('text',), (), lambda post: post.text),
+    'pub_date': ((), (), lambda post: post.pub_date.isoformat()),
+    'author': (
+        ('author__username',),
+        ('author',),
+        lambda post: post.author.username
+    ),
+    'group': (
+        ('group__slug',),
+        ('group',),
+        lambda post: post.group.slug if post.group_id else None
+    ),
+    'image': (('image',), (), _image),
+    'thumbnails': (
+        ('image', 'image_width', 'image_height'),
+        (),
+        _thumbnails
+    ),
+    'comments_count': (
+        ('comments_count',),
+        (),
+        lambda post: post.comments_count
+    ),
+}
+COMMENT_FIELDS = {
+    'id': ((), (), lambda comment: comment.pk),
+    'text': (('text',), (), lambda comment: comment.text),
+    'created': ((), (), lambda comment: comment.created.isoformat()),
+    'author': (
+        ('author__username',),
+        ('author',),
+        lambda comment: comment.author.username
+    ),
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def _error(message, status):
+    return _json({'error': message}, status)
+
+
+def _selected(request, spec):
+    """Выбранные через ?fields= поля: список (имя, функция) и колонки."""
+    raw = request.GET.get('fields')
+    names = [name for name in raw.split(',') if name] if raw else list(spec)
+    unknown = [name for name in names if name not in spec]
+    if unknown:
+        raise FieldsError(
+            'Неизвестные поля: ' + ', '.join(unknown)
+            + '. Доступны: ' + ', '.join(spec)
+        )
+    columns, relations = set(), set()
+    for name in names:
+        field_columns, field_relations, _ = spec[name]
+        columns.update(field_columns)
+        relations.update(field_relations)
+    return [(name, spec[name][2]) for name in names], columns, relations
+
+
+def _narrow(queryset, columns, relations, date_field):
+    # Дата и id нужны курсору, даже если их нет в ответе. Пустой
+    # select_related() тянул бы все связи со всеми колонками
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(date_field, *columns)
+
+
+def _serialize(objects, getters):
+    return [{name: get(obj) for name, get in getters} for obj in objects]
+
+
+def _feed_response(request, queryset, **paginator_options):
+    try:
+        getters, columns, relations = _selected(request, POST_FIELDS)
+    except FieldsError as error:
+        return _error(str(error), 400)
+    page_obj = get_paginator(
+        _narrow(queryset, columns, relations, 'pub_date'),
+        request,
+        **paginator_options
+    )
+    posts = page_obj.object_list
+    if 'thumbnails' in dict(getters):
+        resolve_thumbnails(posts)
+    return _json({
+        'results': _serialize(posts, getters),
+        'next': page_obj.paginator.next_cursor,
+        'previous': page_obj.paginator.previous_cursor,
+    })
+
+
+@require_GET
+@conditional_feed(index_feeds)
+def index(request):
+    return _feed_response(request, Post.objects.all())
+
+
+@require_GET
+@conditional_feed(group_feeds)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).only('pk').first()
+    if group is None:
+        return _error('Группа не найдена', 404)
+    # Не group.posts: связанный менеджер читает group_id каждой строки,
+    # и при only() это запрос на пост
+    return _feed_response(request, Post.objects.filter(group=group))
+
+
+@require_GET
+@conditional_feed(author_feeds)
+def profile(request, username):
+    author = User.objects.filter(username=username).only('pk').first()
+    if author is None:
+        return _error('Пользователь не найден', 404)
+    return _feed_response(request, Post.objects.filter(author=author))
+
+
+def _api_login_required(view):
+    # Вместо редиректа на страницу входа - 401 в JSON
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Нужна авторизация', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_GET
+@_api_login_required
+@conditional_feed(follow_feeds)
+def follow_index(request):
+    return _feed_response(
+        request,
+        Post.objects.all(),
+        paginator_class=TimelinePaginator,
+        user=request.user
+    )
+
+
+@require_GET
+@conditional_feed(single_post_feeds)
+def post_detail(request, post_id):
+    try:
+        getters, columns, relations = _selected(request, POST_FIELDS)
+    except FieldsError as error:
+        return _error(str(error), 400)
+    post = _narrow(
+        Post.objects.filter(pk=post_id), columns, relations, 'pub_date'
+    ).first()
+    if post is None:
+        return _error('Пост не найден', 404)
+    if 'thumbnails' in dict(getters):
+        resolve_thumbnails([post])
+    return _json(_serialize([post], getters)[0])
+
+
+@require_GET
+@conditional_feed(single_post_feeds)
+def comments(request, post_id):
+    """Комментарии поста от старых к новым, по курсору (created, id)."""
+    try:
+        getters, columns, relations = _selected(request, COMMENT_FIELDS)
+    except FieldsError as error:
+        return _error(str(error), 400)
+    if not Post.objects.filter(pk=post_id).exists():
+        return _error('Пост не найден', 404)
+    queryset = _narrow(
+        Comment.objects.filter(post_id=post_id),
+        columns, relations, 'created'
+    ).order_by('created', 'pk')
+    after = decode_cursor(request.GET.get('after', ''))
+    if after is not None:
+        created, pk = after
+        queryset = queryset.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk)
+        )
+    found = list(queryset[:POSTS_COUNT + 1])
+    page = found[:POSTS_COUNT]
+    next_cursor = None
+    if len(found) > POSTS_COUNT:
+        next_cursor = encode_cursor(page[-1], 'created')
+    return _json({
+        'results': _serialize(page, getters),
+        'next': next_cursor,
+    })
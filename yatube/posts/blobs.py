@@ -0,0 +1,92 @@
+"""Счётчики ссылок постов на файлы хранилища по содержимому.
+
+Файл без ссылок не удаляется сразу: его забирает ``manage.py gc_blobs``
+после паузы, чтобы не потерять картинку, которую как раз загружают
+заново. Файлы со старыми именами вида posts/name.jpg не учитываются.
+Счётчики ведут сигналы, поэтому bulk_create и update() их не трогают;
+recount() сверяет их с постами (``manage.py recount``).
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import ImageBlob, Post
+from .storage import is_blob
+
+
+def retain(name, amount=1):
+    if not is_blob(name):
+        return
+    blobs = ImageBlob.objects.filter(name=name)
+    update = {
+        'ref_count': F('ref_count') + amount,
+        'updated_at': timezone.now(),
+    }
+    if blobs.update(**update):
+        return
+    ImageBlob.objects.get_or_create(name=name)
+    blobs.update(**update)
+
+
+def release(name):
+    if not is_blob(name):
+        return
+    ImageBlob.objects.filter(name=name, ref_count__gt=0).update(
+        ref_count=F('ref_count') - 1,
+        updated_at=timezone.now()
+    )
+
+
+def references(name):
+    return Post.objects.filter(image=name).count()
+
+
+def recount(chunk_size=1000, dry_run=False):
+    """Сверяет ref_count с постами; возвращает число исправленных имён."""
+    drift = 0
+    last_name = ''
+    while True:
+        # order_by('image') заменяет Meta.ordering, группировка по имени
+        rows = list(Post.objects.filter(image__gt=last_name).order_by(
+            'image'
+        ).values('image').annotate(amount=Count('pk'))[:chunk_size])
+        if not rows:
+            break
+        last_name = rows[-1]['image']
+        actual = {
+            row['image']: row['amount'] for row in rows
+            if is_blob(row['image'])
+        }
+        stored = ImageBlob.objects.in_bulk(list(actual))
+        created, changed = [], []
+        for name, amount in actual.items():
+            blob = stored.get(name)
+            if blob is None:
+                created.append(ImageBlob(name=name, ref_count=amount))
+            elif blob.ref_count != amount:
+                blob.ref_count = amount
+                changed.append(blob)
+        drift += len(created) + len(changed)
+        if not dry_run:
+            with transaction.atomic():
+                ImageBlob.objects.bulk_create(created, ignore_conflicts=True)
+                ImageBlob.objects.bulk_update(changed, ['ref_count'])
+    # Файлы, на которые посты уже не ссылаются
+    last_name = ''
+    while True:
+        names = list(ImageBlob.objects.filter(
+            name__gt=last_name, ref_count__gt=0
+        ).order_by('name').values_list('name', flat=True)[:chunk_size])
+        if not names:
+            break
+        last_name = names[-1]
+        referenced = set(Post.objects.filter(
+            image__in=names
+        ).values_list('image', flat=True))
+        orphans = [name for name in names if name not in referenced]
+        drift += len(orphans)
+        if orphans and not dry_run:
+            ImageBlob.objects.filter(name__in=orphans).update(
+                ref_count=0, updated_at=timezone.now()
+            )
+    return drift
@@ -0,0 +1,46 @@
+"""Общее для массовой записи в обход save(): импорт и генерация данных.
+
+bulk_create не вызывает сигналов, поэтому счётчики, поисковый индекс,
+материализованные ленты и поколение кэша после такой записи
+пересчитываются одним проходом в refresh_derived().
+"""
+from django.core.management import call_command
+
+from . import feed_cache, timeline
+from .models import Comment, Post
+
+# Поля auto_now_add, которым импорт и генерация передают свои даты
+DATE_FIELDS = ((Post, 'pub_date'), (Comment, 'created'))
+
+
+def keep_date(obj):
+    """Помечает объект: при записи его дата не заменяется текущей.
+
+    Метка живёт на самом объекте, поэтому не влияет на посты и
+    комментарии, которые в это время сохраняют другие потоки.
+    """
+    obj._keep_date = True
+    return obj
+
+
+def _date_pre_save(pre_save, attname):
+    def wrapper(model_instance, add):
+        if getattr(model_instance, '_keep_date', False):
+            return getattr(model_instance, attname)
+        return pre_save(model_instance, add)
+    wrapper.keeps_date = True
+    return wrapper
+
+
+def install_keep_date():
+    for model, name in DATE_FIELDS:
+        field = model._meta.get_field(name)
+        if not getattr(field.pre_save, 'keeps_date', False):
+            field.pre_save = _date_pre_save(field.pre_save, field.attname)
+
+
+def refresh_derived(author_ids, stdout=None):
+    call_command('recount', stdout=stdout)
+    call_command('rebuild_search', stdout=stdout)
+    timeline.backfill_authors(author_ids)
+    feed_cache.bump_generation(feed_cache.ALL)
@@ -1 +1,31 @@
+from django.conf import settings
+
 POSTS_COUNT = 10
+# Глубже этой страницы старые ссылки ?page=N не обслуживаются через OFFSET
+LEGACY_PAGE_LIMIT = 50
+# Размер пачки bulk_create при рассылке постов по лентам подписчиков
+FEED_BATCH_SIZE = getattr(settings, 'POSTS_FEED_BATCH_SIZE', 1000)
+# Посты авторов с большим числом подписчиков не рассылаются,
+# а подмешиваются в ленту при чтении
+FEED_FANOUT_LIMIT = getattr(settings, 'POSTS_FEED_FANOUT_LIMIT', 5000)
+# Время жизни фрагментов лент; устаревание решает поколение, а не TTL
+FEED_CACHE_TTL = getattr(settings, 'POSTS_FEED_CACHE_TTL', 60 * 60)
+# Варианты картинки поста для srcset, от меньшего к большему; создаются
+# сразу после загрузки, чтобы страницы только находили готовые файлы
+POST_THUMBNAILS = (
+    ('320x113', {'crop': 'top', 'upscale': True}),
+    ('640x226', {'crop': 'top', 'upscale': True}),
+    ('960x339', {'crop': 'top', 'upscale': True}),
+)
+# Размер превью-заглушки по большей стороне и качество его JPEG
+PLACEHOLDER_SIDE = 16
+PLACEHOLDER_QUALITY = 40
+# Сколько процессов строят миниатюры; 0 - прямо в процессе запроса
+THUMBNAIL_WORKERS = getattr(settings, 'POSTS_THUMBNAIL_WORKERS', 2)
+# Ограничения на загружаемые картинки и параметры их перекодирования
+UPLOAD_MAX_BYTES = getattr(settings, 'POSTS_UPLOAD_MAX_BYTES', 10 * 1024 ** 2)
+UPLOAD_MAX_PIXELS = getattr(settings, 'POSTS_UPLOAD_MAX_PIXELS', 40_000_000)
+IMAGE_MAX_SIDE = getattr(settings, 'POSTS_IMAGE_MAX_SIDE', 1920)
+# Кадров в анимированном GIF; все кадры вместе тоже не больше UPLOAD_MAX_PIXELS
+GIF_MAX_FRAMES = getattr(settings, 'POSTS_GIF_MAX_FRAMES', 200)
+IMAGE_QUALITY = 85
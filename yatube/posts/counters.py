@@ -0,0 +1,37 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Значения меняются только через F()-выражения, чтобы параллельные
+запросы не теряли обновления. Расхождения (например, после bulk_create,
+который не шлёт сигналов) исправляет команда ``manage.py recount``.
+"""
+from django.db.models import F
+
+from .models import AuthorStats, Post
+
+
+def bump_author(user_id, field, delta):
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    update = {field: F(field) + delta}
+    if delta < 0:
+        # Строку не создаём: пользователь мог удаляться вместе с ней
+        stats.filter(**{f'{field}__gte': -delta}).update(**update)
+        return
+    if stats.update(**update):
+        return
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    stats.update(**update)
+
+
+def bump_comments(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def stats_for(user):
+    """Счётчики пользователя; нулевые, если он ещё ничего не делал."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(user=user)
@@ -0,0 +1,92 @@
+"""Потоковая выгрузка постов, комментариев и подписок.
+
+Записи идут в том же формате, что читает ``manage.py import_content``,
+поэтому выгрузку можно загрузить обратно. Строки читаются через
+values() и iterator(chunk_size=...), без создания моделей и без
+загрузки всего списка в память: расход памяти не зависит от того,
+сколько постов у автора.
+"""
+import csv
+import json
+
+from .models import Comment, Follow, Post
+from .storage import image_storage
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CSV_FIELDS = (
+    'type', 'id', 'author', 'user', 'group', 'post', 'text',
+    'pub_date', 'created', 'image', 'image_url',
+)
+
+
+def export_records(author=None, chunk_size=CHUNK_SIZE):
+    """Посты и комментарии автора и его подписки; без автора - все."""
+    posts = Post.objects.order_by('pk')
+    comments = Comment.objects.order_by('pk')
+    follows = Follow.objects.order_by('pk')
+    if author is not None:
+        posts = posts.filter(author=author)
+        comments = comments.filter(author=author)
+        follows = follows.filter(user=author)
+    for row in posts.values(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date', 'image'
+    ).iterator(chunk_size=chunk_size):
+        image = row['image']
+        yield {
+            'type': 'post',
+            'id': row['pk'],
+            'author': row['author__username'],
+            'group': row['group__slug'] or '',
+            'text': row['text'],
+            'pub_date': row['pub_date'].isoformat(),
+            'image': image,
+            'image_url': image_storage.url(image) if image else '',
+        }
+    for row in comments.values(
+        'post_id', 'author__username', 'text', 'created'
+    ).iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'comment',
+            'post': row['post_id'],
+            'author': row['author__username'],
+            'text': row['text'],
+            'created': row['created'].isoformat(),
+        }
+    for row in follows.values(
+        'user__username', 'author__username'
+    ).iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'follow',
+            'user': row['user__username'],
+            'author': row['author__username'],
+        }
+
+
+class _Line:
+    """Файл для csv.writer, который просто возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records):
+    writer = csv.DictWriter(_Line(), CSV_FIELDS)
+    yield writer.writeheader()
+    for record in records:
+        yield writer.writerow(record)
+
+
+def export_lines(data_format, author=None, chunk_size=CHUNK_SIZE):
+    records = export_records(author, chunk_size)
+    if data_format == 'csv':
+        return csv_lines(records)
+    return jsonl_lines(records)
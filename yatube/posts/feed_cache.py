@@ -0,0 +1,179 @@
+"""Поколения лент для ключей фрагментного кэша и условных GET.
+
+Поколение ведётся отдельно для каждой ленты: главной, группы, автора,
+ленты подписок читателя и поста в API. Изменение поста обновляет только
+те ленты, где пост виден, поэтому комментарий в одной группе не
+сбрасывает кэш остальных страниц. Фрагменты со старым поколением в
+ключе просто перестают читаться, и TTL фрагментов может быть долгим.
+Из поколений и времени последнего изменения строятся ETag и
+Last-Modified, так что ответ 304 не требует ни одного SQL-запроса.
+
+Общее поколение ALL входит в каждую ленту: его обновляют редкие
+изменения, видимые везде (группы, массовый импорт).
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . import timeline
+from .models import Follow
+
+ALL = 'all'
+INDEX = 'index'
+# Посты авторов без рассылки видны в лентах всех их подписчиков
+PULL = 'pull'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def author_feed(username):
+    return f'author:{username}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def post_feed(post_id):
+    return f'post:{post_id}'
+
+
+def author_counts_feed(author_id):
+    # Число постов автора на страницах его постов: меняется только с
+    # его новыми и удалёнными постами
+    return f'author_counts:{author_id}'
+
+
+def _author_key(post_id):
+    return f'posts:post_author:{post_id}'
+
+
+def remember_author(post):
+    # Автор поста не меняется, запись можно не обновлять
+    cache.set(_author_key(post.pk), post.author_id, None)
+
+
+def author_of(post_id):
+    """Id автора поста из кэша или None, если его там нет."""
+    return cache.get(_author_key(post_id))
+
+
+def forget_post(post_id):
+    cache.delete(_author_key(post_id))
+
+
+def _key(feed):
+    return f'posts:feed:{feed}'
+
+
+def _new_state(now=None):
+    return uuid.uuid4().hex[:12], now or timezone.now()
+
+
+def _states(feeds):
+    keys = [_key(feed) for feed in (ALL, *feeds)]
+    states = cache.get_many(keys)
+    missing = [key for key in keys if key not in states]
+    if missing:
+        # Вытесненное поколение заменяется новым: лента как будто
+        # изменилась только что
+        fresh = _new_state()
+        for key in missing:
+            cache.add(key, fresh, None)
+        stored = cache.get_many(missing)
+        states.update({key: stored.get(key, fresh) for key in missing})
+    return [states[key] for key in keys]
+
+
+def get_generation(*feeds):
+    return '-'.join(token for token, _ in _states(feeds))
+
+
+def changed_at(*feeds):
+    return max(moment for _, moment in _states(feeds))
+
+
+def bump_generation(*feeds):
+    state = _new_state()
+    cache.set_many({_key(feed): state for feed in feeds}, None)
+
+
+def follower_feeds(author_id):
+    """Ленты подписок, в которых видны посты автора."""
+    if timeline.is_pull_author(author_id):
+        return [PULL]
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).distinct()
+    return [follow_feed(user_id) for user_id in followers]
+
+
+def post_feeds(post):
+    """Все ленты, где виден пост, включая ленты подписчиков автора."""
+    feeds = [
+        INDEX,
+        author_feed(post.author.username),
+        post_feed(post.pk),
+    ]
+    if post.group_id:
+        feeds.append(group_feed(post.group.slug))
+    feeds.extend(follower_feeds(post.author_id))
+    return feeds
+
+
+def conditional_feed(feeds):
+    """Условный GET для представления, которое показывает ленты feeds.
+
+    ``feeds(request, *args, **kwargs)`` возвращает имена лент по
+    аргументам представления, не обращаясь к базе. None - ленты пока
+    неизвестны: ответ уходит без ETag и Last-Modified.
+    """
+    def etag(request, *args, **kwargs):
+        names = feeds(request, *args, **kwargs)
+        if names is None:
+            return None
+        # Страница зависит от поколений, адреса и того, кто её читает
+        reader = request.user.pk if request.user.is_authenticated else 'anon'
+        generation = get_generation(*names)
+        raw = f'{generation}|{reader}|{request.get_full_path()}'
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        names = feeds(request, *args, **kwargs)
+        return None if names is None else changed_at(*names)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def index_feeds(request):
+    return [INDEX]
+
+
+def group_feeds(request, slug):
+    return [group_feed(slug)]
+
+
+def author_feeds(request, username):
+    return [author_feed(username)]
+
+
+def follow_feeds(request):
+    return [follow_feed(request.user.pk), PULL]
+
+
+def single_post_feeds(request, post_id):
+    return [post_feed(post_id)]
+
+
+def post_detail_feeds(request, post_id):
+    # Без автора нельзя проверить число его постов; представление
+    # запомнит автора, и следующий ответ получит валидаторы
+    author_id = author_of(post_id)
+    if author_id is None:
+        return None
+    return [post_feed(post_id), author_counts_feed(author_id)]
@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
 from .models import Post, Comment
+from .uploads import process_upload
 
 
 class PostForm(forms.ModelForm):
@@ -15,6 +18,40 @@ class PostForm(forms.ModelForm):
             'group': 'Выберите группу'
         }
 
+    image_meta = None
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        image, width, height, size = process_upload(image)
+        self.image_meta = (width, height, size)
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit=False)
+        if self.image_meta is not None:
+            (
+                post.image_width,
+                post.image_height,
+                post.image_bytes
+            ) = self.image_meta
+            # Заглушку новой картинки посчитает фоновая обработка
+            post.placeholder_color = post.placeholder = ''
+        elif not post.image:
+            post.image_width = post.image_height = post.image_bytes = None
+            post.placeholder_color = post.placeholder = ''
+        if commit:
+            post.save()
+        return post
+
+
+class PostAdminForm(PostForm):
+    """Форма админки: картинка проходит ту же проверку, что и на сайте."""
+
+    class Meta(PostForm.Meta):
+        fields = '__all__'
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
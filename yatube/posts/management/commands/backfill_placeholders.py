@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.placeholders import store_placeholder
+
+from .recount import chunked_ids
+
+
+class Command(BaseCommand):
+    help = 'Считает заглушки картинок для постов, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересчитать заглушки и у постов, где они уже есть'
+        )
+
+    def handle(self, *args, chunk_size, force, **options):
+        queryset = Post.objects.exclude(image='')
+        if not force:
+            queryset = queryset.filter(placeholder_color='')
+        done = failed = 0
+        for ids in chunked_ids(queryset, chunk_size):
+            # Один файл может быть у нескольких постов, считаем его раз
+            names = set(Post.objects.filter(pk__in=ids).values_list(
+                'image', flat=True
+            ))
+            with transaction.atomic():
+                for name in names:
+                    try:
+                        done += store_placeholder(name)
+                    except Exception as error:
+                        failed += 1
+                        self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'Заглушек посчитано: {done}, файлов с ошибкой: {failed}'
+        )
@@ -0,0 +1,170 @@
+import gc
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from core import benchmark
+from core.queries import QueryRecorder
+from posts.models import Follow, Group, Post, User
+from posts.seed import SCALES, Seeder
+
+# Время сравнивается с допуском, число запросов - строго
+TIME_METRICS = ('p50', 'p95', 'p99', 'peak_kb')
+QUERY_METRICS = ('queries',)
+
+
+def pick_targets():
+    """Читатель с самой большой лентой и адреса самых тяжёлых страниц."""
+    group = Group.objects.annotate(
+        amount=Count('posts')
+    ).order_by('-amount').first()
+    author = User.objects.filter(
+        stats__isnull=False
+    ).order_by('-stats__posts_count').first()
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    reader = Follow.objects.order_by().values('user').annotate(
+        amount=Count('pk')
+    ).order_by('-amount').first()
+    if not (group and author and post and reader):
+        raise CommandError(
+            'В базе мало данных; запустите команду с --seed'
+        )
+    reader = User.objects.get(pk=reader['user'])
+    return reader, {
+        'posts:index': reverse('posts:index'),
+        'posts:group_posts': reverse('posts:group_posts', args=[group.slug]),
+        'posts:profile': reverse('posts:profile', args=[author.username]),
+        'posts:post_detail': reverse('posts:post_detail', args=[post.pk]),
+        'posts:follow_index': reverse('posts:follow_index'),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет публичные страницы на объёмных данных: p50/p95/p99, '
+        'число SQL-запросов и пик памяти; сравнивает с базовым файлом. '
+        'С --seed сначала дописывает данные в текущую базу - запускайте '
+        'на отдельной копии'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            choices=SCALES,
+            help='Сгенерировать данные этого масштаба перед замерами'
+        )
+        for name in SCALES['tiny']:
+            parser.add_argument(
+                f'--{name}', type=int, help='Переопределить масштаб'
+            )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--anonymous',
+            action='store_true',
+            help=(
+                'Открывать публичные страницы без входа, то есть через '
+                'кэш целых страниц'
+            )
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом'
+        )
+        parser.add_argument('--output', help='Записать результаты в JSON')
+        parser.add_argument('--baseline', help='Сравнить с этим JSON')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Допустимый рост времени и памяти, доля'
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            scale = dict(SCALES[options['seed']])
+            for name in scale:
+                if options[name] is not None:
+                    scale[name] = options[name]
+            started = time.monotonic()
+            Seeder(options['batch_size'], stdout=self.stdout).seed(**scale)
+            self.stdout.write(
+                f'Данные созданы за {time.monotonic() - started:.1f} с'
+            )
+
+        results = {}
+        reader, urls = pick_targets()
+        for name, url in urls.items():
+            # Со входом кэш целых страниц пропускается и видна работа view
+            user = reader
+            if options['anonymous'] and name != 'posts:follow_index':
+                user = None
+            results[name] = self.measure(url, user, options)
+            self.stdout.write(
+                '{name}: p50 {p50:.1f} мс, p95 {p95:.1f} мс, '
+                'p99 {p99:.1f} мс, запросов {queries}, '
+                'пик {peak_kb:.0f} КБ'.format(name=name, **results[name])
+            )
+        if options['output']:
+            benchmark.save(options['output'], results)
+        if options['baseline']:
+            self.check_baseline(results, options)
+
+    def measure(self, url, user, options):
+        # Не из INTERNAL_IPS, чтобы debug toolbar не вмешивался в замеры
+        client = Client(REMOTE_ADDR='10.0.0.1')
+        if user is not None:
+            client.force_login(user)
+
+        def get():
+            if options['cold']:
+                cache.clear()
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+
+        for _ in range(options['warmup']):
+            get()
+        samples, queries = [], []
+        gc.collect()
+        for _ in range(options['requests']):
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                start = time.perf_counter()
+                get()
+                samples.append(time.perf_counter() - start)
+            queries.append(recorder.count)
+
+        # Память - отдельным запросом: tracemalloc сильно замедляет код
+        tracemalloc.start()
+        get()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        summary = benchmark.summarize(samples)
+        summary['queries'] = max(queries)
+        summary['peak_kb'] = peak / 1024
+        return summary
+
+    def check_baseline(self, results, options):
+        baseline = benchmark.load(options['baseline'])
+        regressions = benchmark.compare(
+            results, baseline, TIME_METRICS, options['tolerance']
+        ) + benchmark.compare(results, baseline, QUERY_METRICS, 0)
+        for name, metric, before, after in regressions:
+            self.stderr.write(
+                f'{name}: {metric} {before:.1f} -> {after:.1f}'
+            )
+        if regressions:
+            raise CommandError(
+                f'Регрессий относительно базового файла: {len(regressions)}'
+            )
+        self.stdout.write('Регрессий нет')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import CHUNK_SIZE, FORMATS, export_lines
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии и подписки в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument(
+            '--author',
+            help='Выгрузить только данные этого пользователя'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для выгрузки; по умолчанию stdout'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, format, author, output, chunk_size, **options):
+        if author is not None:
+            try:
+                author = User.objects.get(username=author)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {author} не найден')
+        lines = export_lines(format, author, chunk_size)
+        if output == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(output, 'w', newline='', encoding='utf-8') as file_obj:
+            file_obj.writelines(lines)
@@ -0,0 +1,87 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from posts import blobs
+from posts.models import ImageBlob
+from posts.storage import image_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы картинок с именами по содержимому, на которые не '
+        'ссылается ни один пост, вместе с их миниатюрами, и брошенные '
+        'временные файлы загрузок. Остальные файлы медиа убирает gc_media'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=60 * 60,
+            help='Сколько секунд файл без ссылок ещё хранится'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено'
+        )
+
+    def handle(self, *args, grace, dry_run, **options):
+        cutoff = timezone.now() - timedelta(seconds=grace)
+        unused = ImageBlob.objects.filter(
+            ref_count=0, updated_at__lt=cutoff
+        ).values_list('name', flat=True)
+        removed = reclaimed = drifted = 0
+        for name in unused.iterator():
+            exists = image_storage.exists(name)
+            if exists and image_storage.get_modified_time(name) >= cutoff:
+                # Файл только что загрузили заново, пост ещё сохраняется
+                continue
+            # Счётчик мог разойтись с постами (bulk_create, update()):
+            # решает сама ссылка, а не ref_count
+            amount = blobs.references(name)
+            if amount:
+                drifted += 1
+                if not dry_run:
+                    ImageBlob.objects.filter(name=name).update(
+                        ref_count=amount
+                    )
+                continue
+            size = image_storage.size(name) if exists else 0
+            if not dry_run:
+                # Удаляются и файл, и все его миниатюры из KV-хранилища sorl
+                delete(ImageFile(name, image_storage))
+                ImageBlob.objects.filter(name=name, ref_count=0).delete()
+            removed += 1
+            reclaimed += size
+        parts, part_bytes = self.remove_partial_uploads(cutoff, dry_run)
+        self.stdout.write(
+            f'Удалено файлов: {removed}, недокачанных: {parts}, '
+            f'освобождено байт: {reclaimed + part_bytes}, '
+            f'исправлено счётчиков: {drifted}'
+        )
+
+    def remove_partial_uploads(self, cutoff, dry_run):
+        # Хранилище пишет загрузку во временный .part в корне MEDIA_ROOT;
+        # после падения процесса такой файл остаётся навсегда
+        removed = size = 0
+        try:
+            entries = list(os.scandir(image_storage.location))
+        except FileNotFoundError:
+            return removed, size
+        for entry in entries:
+            if not entry.name.endswith('.part') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            if stat.st_mtime >= cutoff.timestamp():
+                continue
+            if not dry_run:
+                os.remove(entry.path)
+            removed += 1
+            size += stat.st_size
+        return removed, size
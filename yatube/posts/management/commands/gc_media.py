@@ -0,0 +1,213 @@
+"""Сборщик файлов медиа, которые не ведут счётчики ссылок.
+
+Файлы поделены между двумя командами:
+
+* ``gc_blobs`` - картинки с именами по содержимому (posts/xx/<sha256>)
+  вместе с их миниатюрами и брошенные .part загрузок. Удаление решают
+  счётчики ImageBlob и пауза --grace;
+* ``gc_media`` - картинки со старыми именами (posts/name.jpg) без
+  постов, миниатюры размеров, которых больше нет в POST_THUMBNAILS, и
+  файлы миниатюр без записи в KV-хранилище sorl.
+
+Ни одна из команд не держит в памяти список всех файлов или ключей:
+каталоги читаются потоком, база и KV-хранилище - пачками.
+"""
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize, serialize
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+
+from posts.conf import POST_THUMBNAILS
+from posts.models import Post
+from posts.storage import image_storage, is_blob
+from posts.thumbnails import get_many_raw, thumbnail_file
+
+
+def scan_files(root):
+    """Файлы под root по одному, через os.scandir, без общего списка."""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def stored(value):
+    # cached_db запоминает в кэше и отсутствие записи
+    return bool(value) and value != EMPTY_VALUE
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки со старыми именами, на которые не ссылается ни '
+        'один пост, и миниатюры, которые шаблоны больше не используют'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='Не больше стольких удалений в секунду; 0 - без ограничения'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, ничего не удаляя'
+        )
+
+    def handle(self, *args, batch_size, min_age, rate, dry_run, **options):
+        self.batch_size = batch_size
+        self.cutoff = time.time() - min_age
+        self.delay = 1 / rate if rate > 0 else 0
+        self.dry_run = dry_run
+        self.removed = self.reclaimed = 0
+
+        self.collect_images()
+        self.collect_thumbnails()
+        verb = 'Можно удалить' if dry_run else 'Удалено'
+        self.stdout.write(
+            f'{verb} файлов: {self.removed}, байт: {self.reclaimed}'
+        )
+
+    def old_files(self, root, relative_to):
+        for entry in scan_files(root):
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime < self.cutoff:
+                name = os.path.relpath(entry.path, relative_to)
+                yield name.replace(os.sep, '/'), entry.path, stat.st_size
+
+    def remove(self, orphans):
+        for name, path, size in orphans:
+            if not self.dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                if self.delay:
+                    time.sleep(self.delay)
+            self.removed += 1
+            self.reclaimed += size
+
+    def collect_images(self):
+        location = image_storage.location
+        files = (
+            item for item in self.old_files(
+                os.path.join(location, 'posts'), location
+            )
+            # Файлы с именами по содержимому убирает gc_blobs
+            if not is_blob(item[0])
+        )
+        for batch in batches(files, self.batch_size):
+            referenced = set(Post.objects.filter(
+                image__in=[name for name, path, size in batch]
+            ).values_list('image', flat=True))
+            orphans = [item for item in batch if item[0] not in referenced]
+            if orphans and not self.dry_run:
+                # Миниатюры и записи sorl уходят вместе с картинкой
+                for name, path, size in orphans:
+                    default.kvstore.delete(ImageFile(name, image_storage))
+            self.remove(orphans)
+
+    def collect_thumbnails(self):
+        self.collect_stale_variants()
+        self.collect_unknown_thumbnails()
+
+    def collect_stale_variants(self):
+        """Миниатюры картинок постов, не входящие в POST_THUMBNAILS."""
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        for batch in batches(
+            names.iterator(chunk_size=self.batch_size), self.batch_size
+        ):
+            sources = {
+                add_prefix(ImageFile(name, image_storage).key, 'thumbnails'):
+                    ImageFile(name, image_storage)
+                for name in batch
+            }
+            lists = get_many_raw(list(sources))
+            for list_key, value in lists.items():
+                if not stored(value):
+                    continue
+                source = sources[list_key]
+                expected = {
+                    thumbnail_file(source, geometry, options).key
+                    for geometry, options in POST_THUMBNAILS
+                }
+                listed = deserialize(value)
+                stale = [key for key in listed if key not in expected]
+                if stale:
+                    self.remove_variants(list_key, listed, stale)
+
+    def remove_variants(self, list_key, listed, stale):
+        entries = get_many_raw([add_prefix(key) for key in stale])
+        storage = default.storage
+        orphans = []
+        for value in entries.values():
+            if not stored(value):
+                continue
+            thumbnail = deserialize_image_file(value)
+            path = storage.path(thumbnail.name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime < self.cutoff:
+                orphans.append((thumbnail.name, path, stat.st_size))
+        self.remove(orphans)
+        if self.dry_run:
+            return
+        kvstore = default.kvstore
+        kvstore._delete_raw(*(add_prefix(key) for key in stale))
+        kept = [key for key in listed if key not in stale]
+        if kept:
+            kvstore._set_raw(list_key, serialize(kept))
+        else:
+            kvstore._delete_raw(list_key)
+
+    def collect_unknown_thumbnails(self):
+        """Файлы миниатюр, о которых KV-хранилище sorl ничего не знает."""
+        storage = default.storage
+        location = storage.path('')
+        root = storage.path(thumbnail_settings.THUMBNAIL_PREFIX.strip('/'))
+        for batch in batches(self.old_files(root, location), self.batch_size):
+            keys = {
+                add_prefix(ImageFile(item[0], storage).key): item
+                for item in batch
+            }
+            known = get_many_raw(list(keys))
+            self.remove([
+                item for key, item in keys.items()
+                if not stored(known.get(key))
+            ])
@@ -0,0 +1,372 @@
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import blobs
+from posts.bulk import keep_date, refresh_derived
+from posts.models import Comment, Follow, Group, Post, User
+from posts.storage import image_storage
+from posts.thumbnails import queue_thumbnails
+
+FORMATS = ('jsonl', 'csv')
+
+
+def read_records(file_obj, data_format):
+    """Записи входного файла по одной, вместе с номером.
+
+    Строки JSON Lines разбираются уже в пачке, чтобы одна испорченная
+    строка стала ошибкой записи, а не остановила импорт.
+    """
+    if data_format == 'csv':
+        rows = csv.DictReader(file_obj)
+    else:
+        rows = (line for line in file_obj if line.strip())
+    return enumerate(rows, start=1)
+
+
+def source_key(record_id, *parts):
+    """Ключ записи импорта: из её id, а без него - из содержимого."""
+    source = record_id or '|'.join(map(str, parts))
+    return hashlib.sha1(str(source).encode()).hexdigest()
+
+
+class Checkpoint:
+    """Сколько записей файла уже сохранено и чьи ленты пересобрать.
+
+    Пишется после каждой пачки. Авторы хранятся вместе с позицией:
+    после продолжения с контрольной точки ленты нужны и для постов и
+    подписок, сохранённых до падения.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as file_obj:
+                data = json.loads(file_obj.read().strip() or '0')
+        except FileNotFoundError:
+            return 0, set()
+        if isinstance(data, int):
+            # Точка, записанная до того, как в ней появились авторы
+            return data, set()
+        return data['position'], set(data['authors'])
+
+    def save(self, position, authors):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as file_obj:
+            json.dump(
+                {'position': position, 'authors': sorted(authors)}, file_obj
+            )
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковый импорт постов, комментариев и подписок из JSON Lines '
+        'или CSV. Каждая запись содержит поле type: post, comment или follow'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с данными; - для stdin')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки; по умолчанию <path>.checkpoint'
+        )
+        parser.add_argument(
+            '--create-missing',
+            action='store_true',
+            help='Создавать неизвестных пользователей и группы'
+        )
+        parser.add_argument(
+            '--skip-derived',
+            action='store_true',
+            help='Не пересчитывать счётчики, поиск и ленты после импорта'
+        )
+
+    def handle(self, *args, path, batch_size, create_missing, skip_derived,
+               **options):
+        data_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        checkpoint = None
+        if path != '-':
+            checkpoint = Checkpoint(
+                options['checkpoint'] or path + '.checkpoint'
+            )
+        self.create_missing = create_missing
+        self.users = {}
+        self.groups = {}
+        self.errors = 0
+
+        start, self.authors = checkpoint.load() if checkpoint else (0, set())
+        if start:
+            self.stdout.write(f'Продолжаем с записи {start + 1}')
+        file_obj = sys.stdin if path == '-' else open(
+            path, newline='', encoding='utf-8'
+        )
+        imported = 0
+        started = time.monotonic()
+        try:
+            records = islice(read_records(file_obj, data_format), start, None)
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                imported += self.save_batch(batch)
+                if checkpoint:
+                    checkpoint.save(batch[-1][0], self.authors)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Записей: {batch[-1][0]}, сохранено: {imported}, '
+                    f'{imported / max(elapsed, 1e-9):.0f} в секунду'
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        finally:
+            if file_obj is not sys.stdin:
+                file_obj.close()
+        if checkpoint:
+            checkpoint.clear()
+        if not skip_derived:
+            self.stdout.write('Пересчёт счётчиков, поиска и лент...')
+            refresh_derived(self.authors, self.stdout)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Импортировано: {imported}, ошибок: {self.errors}, '
+            f'за {elapsed:.1f} с'
+        )
+
+    def save_batch(self, batch):
+        """Пишет пачку целиком или, при ошибке базы, не пишет ничего."""
+        users, groups = dict(self.users), dict(self.groups)
+        try:
+            with transaction.atomic():
+                return self.import_batch(batch)
+        except IntegrityError as error:
+            # Созданные в пачке пользователи и группы откатились вместе с ней
+            self.users, self.groups = users, groups
+            self.errors += len(batch)
+            self.stderr.write(
+                f'Записи {batch[0][0]}-{batch[-1][0]} не сохранены: {error}'
+            )
+            return 0
+
+    def error(self, number, message):
+        self.errors += 1
+        self.stderr.write(f'Запись {number}: {message}')
+
+    def resolve(self, cache, model, field, keys, defaults):
+        """Находит id по ключам пачкой, дополняя кэш в памяти."""
+        missing = {key for key in keys if key and key not in cache}
+        if not missing:
+            return
+        cache.update(model.objects.filter(
+            **{f'{field}__in': missing}
+        ).values_list(field, 'pk'))
+        missing -= cache.keys()
+        if missing and self.create_missing:
+            model.objects.bulk_create(
+                [model(**{field: key}, **defaults(key)) for key in missing],
+                ignore_conflicts=True
+            )
+            cache.update(model.objects.filter(
+                **{f'{field}__in': missing}
+            ).values_list(field, 'pk'))
+
+    def parse(self, batch):
+        records = []
+        for number, record in batch:
+            if isinstance(record, str):
+                try:
+                    record = json.loads(record)
+                except ValueError as error:
+                    self.error(number, f'неверный JSON: {error}')
+                    continue
+            if not isinstance(record, dict):
+                self.error(number, 'запись не объект')
+                continue
+            records.append((number, record))
+        return records
+
+    def import_batch(self, batch):
+        batch = self.parse(batch)
+        usernames, slugs = set(), set()
+        for number, record in batch:
+            usernames.update((record.get('author'), record.get('user')))
+            slugs.add(record.get('group'))
+        self.resolve(
+            self.users, User, 'username', usernames,
+            lambda key: {'password': '!'}
+        )
+        self.resolve(
+            self.groups, Group, 'slug', slugs,
+            lambda key: {'title': key, 'description': ''}
+        )
+
+        builders = {
+            'post': self.build_post,
+            'comment': self.build_comment,
+            'follow': self.build_follow,
+        }
+        objects = {'post': [], 'comment': [], 'follow': []}
+        for number, record in batch:
+            builder = builders.get(record.get('type'))
+            if builder is None:
+                self.error(number, f'неизвестный тип {record.get("type")!r}')
+                continue
+            try:
+                obj = builder(record)
+            except (KeyError, ValueError) as error:
+                self.error(number, f'нет или неверно поле {error}')
+                continue
+            objects[record['type']].append((number, obj))
+
+        follows = self.new_follows(obj for _, obj in objects['follow'])
+        posts = self.new_posts(obj for _, obj in objects['post'])
+        # Посты раньше комментариев: комментарии ссылаются на них
+        Post.objects.bulk_create(posts, ignore_conflicts=True)
+        comments = self.known_posts(objects['comment'])
+        Comment.objects.bulk_create(comments, ignore_conflicts=True)
+        Follow.objects.bulk_create(follows)
+        self.register_images(posts)
+        self.authors.update(post.author_id for post in posts)
+        self.authors.update(follow.author_id for follow in follows)
+        return len(posts) + len(comments) + len(follows)
+
+    def user_id(self, record, field):
+        username = record[field]
+        if username not in self.users:
+            raise KeyError(field)
+        return self.users[username]
+
+    def date(self, record, field):
+        value = record.get(field)
+        if not value:
+            return timezone.now()
+        date = parse_datetime(value)
+        if date is None:
+            raise ValueError(field)
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
+
+    def build_post(self, record):
+        group = record.get('group') or None
+        if group is not None and group not in self.groups:
+            raise KeyError('group')
+        # id из CSV приходит строкой
+        pk = int(record['id']) if record.get('id') else None
+        post = keep_date(Post(
+            pk=pk,
+            author_id=self.user_id(record, 'author'),
+            group_id=self.groups.get(group),
+            text=record['text'],
+            image=record.get('image') or '',
+            pub_date=self.date(record, 'pub_date'),
+        ))
+        post.source_id = source_key(
+            pk, post.author_id, post.group_id,
+            record.get('pub_date') or '', post.text, post.image.name,
+        )
+        return post
+
+    def build_comment(self, record):
+        comment = keep_date(Comment(
+            post_id=int(record['post']),
+            author_id=self.user_id(record, 'author'),
+            text=record['text'],
+            created=self.date(record, 'created'),
+        ))
+        comment.source_id = source_key(
+            record.get('id'), comment.post_id, comment.author_id,
+            record.get('created') or '', comment.text,
+        )
+        return comment
+
+    def build_follow(self, record):
+        follow = Follow(
+            user_id=self.user_id(record, 'user'),
+            author_id=self.user_id(record, 'author'),
+        )
+        if follow.user_id == follow.author_id:
+            raise ValueError('author')
+        return follow
+
+    def new_posts(self, posts):
+        """Посты, которых ещё нет ни по id, ни по ключу импорта.
+
+        Повтор файла их пропускает, поэтому ссылки на картинки и задачи
+        миниатюр не заводятся для них второй раз.
+        """
+        posts = {post.source_id: post for post in posts}
+        if not posts:
+            return []
+        existing = Post.objects.filter(
+            Q(source_id__in=posts.keys())
+            | Q(pk__in={post.pk for post in posts.values() if post.pk})
+        ).values_list('pk', 'source_id')
+        pks, sources = set(), set()
+        for pk, source_id in existing:
+            pks.add(pk)
+            sources.add(source_id)
+        return [
+            post for source_id, post in posts.items()
+            if source_id not in sources and post.pk not in pks
+        ]
+
+    def known_posts(self, comments):
+        """Комментарии к существующим постам; остальные - ошибки записей."""
+        existing = set(Post.objects.filter(
+            pk__in={comment.post_id for _, comment in comments}
+        ).values_list('pk', flat=True))
+        known = []
+        for number, comment in comments:
+            if comment.post_id not in existing:
+                self.error(number, f'нет поста {comment.post_id}')
+                continue
+            known.append(comment)
+        return known
+
+    def register_images(self, posts):
+        # bulk_create не вызывает сигналов: ссылки на файл учитываются
+        # здесь, миниатюры строятся после фиксации пачки. Файлы дампа
+        # могут скопировать и после импорта: без миниатюр пост
+        # показывает оригинал
+        images = Counter(post.image.name for post in posts if post.image)
+        for name, amount in images.items():
+            blobs.retain(name, amount)
+            if image_storage.exists(name):
+                queue_thumbnails(name)
+
+    def new_follows(self, follows):
+        """Подписки без повторов - ни в пачке, ни среди уже сохранённых."""
+        pairs = {
+            (follow.user_id, follow.author_id): follow for follow in follows
+        }
+        if not pairs:
+            return []
+        existing = set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        return [
+            follow for pair, follow in pairs.items() if pair not in existing
+        ]
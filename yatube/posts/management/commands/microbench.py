@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+from posts.microbench import CASES
+
+
+class Command(BaseCommand):
+    help = (
+        'Микро-замеры карточки поста, тегов и фильтров шаблонов, '
+        'пагинатора и создания моделей; время в микросекундах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'cases', nargs='*', help='Какие случаи мерить; по умолчанию все'
+        )
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--repeats', type=int, default=20)
+        parser.add_argument('--number', type=int, default=100)
+        parser.add_argument('--output', help='Записать результаты в JSON')
+        parser.add_argument('--baseline', help='Сравнить с этим JSON')
+        parser.add_argument('--tolerance', type=float, default=0.2)
+
+    def handle(self, *args, cases, warmup, repeats, number, output,
+               baseline, tolerance, **options):
+        unknown = set(cases) - set(CASES)
+        if unknown:
+            raise CommandError(
+                'Неизвестные случаи: ' + ', '.join(sorted(unknown))
+            )
+        results = {}
+        for name in cases or CASES:
+            func = CASES[name]()
+            results[name] = benchmark.measure(func, warmup, repeats, number)
+            self.stdout.write(
+                '{name}: p50 {p50:.1f} мкс, p95 {p95:.1f} мкс, '
+                '± {stdev:.1f}'.format(name=name, **results[name])
+            )
+        if output:
+            benchmark.save(output, results)
+        if baseline:
+            regressions = benchmark.compare(
+                results, benchmark.load(baseline), ('p50',), tolerance
+            )
+            for name, metric, before, after in regressions:
+                self.stderr.write(
+                    f'{name}: {metric} {before:.1f} -> {after:.1f} мкс'
+                )
+            if regressions:
+                raise CommandError(f'Регрессий: {len(regressions)}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, chunk_size, **options):
+        if not search.is_available():
+            self.stderr.write('Полнотекстовый индекс есть только в SQLite')
+            return
+        posts = Post.objects.order_by().values_list('pk', 'text')
+        with transaction.atomic():
+            total = search.rebuild(
+                posts.iterator(chunk_size=chunk_size), chunk_size
+            )
+        self.stdout.write(f'Проиндексировано постов: {total}')
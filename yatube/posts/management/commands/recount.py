@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts import blobs
+from posts.models import AuthorStats, Comment, Follow, Post, User
+
+AUTHOR_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def chunked_ids(queryset, chunk_size):
+    """Первичные ключи пачками, без OFFSET по всей таблице."""
+    last_pk = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list(
+            'pk', flat=True
+        )[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def grouped_counts(model, field, ids):
+    # order_by() убирает Meta.ordering из GROUP BY
+    rows = model.objects.filter(**{f'{field}__in': ids}).order_by().values(
+        field
+    ).annotate(amount=Count('pk'))
+    return {row[field]: row['amount'] for row in rows}
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев, подписок '
+        'и ссылок на картинки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя'
+        )
+
+    def handle(self, *args, chunk_size, dry_run, **options):
+        authors_drift = self.recount_authors(chunk_size, dry_run)
+        posts_drift = self.recount_posts(chunk_size, dry_run)
+        blobs_drift = blobs.recount(chunk_size, dry_run)
+        self.stdout.write(
+            f'Расхождений у пользователей: {authors_drift}, '
+            f'у постов: {posts_drift}, у картинок: {blobs_drift}'
+        )
+
+    def recount_authors(self, chunk_size, dry_run):
+        drift = 0
+        for ids in chunked_ids(User.objects.all(), chunk_size):
+            actual = {
+                counter: grouped_counts(model, field, ids)
+                for counter, (model, field) in AUTHOR_COUNTERS.items()
+            }
+            stored = AuthorStats.objects.in_bulk(ids)
+            changed = []
+            for user_id in ids:
+                stats = stored.get(user_id, AuthorStats(user_id=user_id))
+                stale = False
+                for counter, amounts in actual.items():
+                    value = amounts.get(user_id, 0)
+                    if getattr(stats, counter) != value:
+                        setattr(stats, counter, value)
+                        stale = True
+                if stale:
+                    changed.append(stats)
+            drift += len(changed)
+            if changed and not dry_run:
+                with transaction.atomic():
+                    AuthorStats.objects.bulk_create(
+                        [s for s in changed if s.pk not in stored]
+                    )
+                    AuthorStats.objects.bulk_update(
+                        [s for s in changed if s.pk in stored],
+                        list(AUTHOR_COUNTERS)
+                    )
+        return drift
+
+    def recount_posts(self, chunk_size, dry_run):
+        drift = 0
+        for ids in chunked_ids(Post.objects.all(), chunk_size):
+            actual = grouped_counts(Comment, 'post', ids)
+            changed = []
+            posts = Post.objects.filter(pk__in=ids).order_by()
+            for post in posts.only('comments_count'):
+                value = actual.get(post.pk, 0)
+                if post.comments_count != value:
+                    post.comments_count = value
+                    changed.append(post)
+            drift += len(changed)
+            if changed and not dry_run:
+                with transaction.atomic():
+                    Post.objects.bulk_update(changed, ['comments_count'])
+        return drift
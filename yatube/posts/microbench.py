@@ -0,0 +1,126 @@
+"""Микро-замеры горячих мест вывода ленты.
+
+Каждый случай - функция, которая готовит данные и возвращает вызов для
+замера. Всё, кроме постраничного вывода, работает в памяти, без базы:
+так в цифрах видна цена самого шаблонного тега, фильтра или модели.
+"""
+from django.core.paginator import Paginator
+from django.template import Context, Template
+from django.test import RequestFactory
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .conf import POST_THUMBNAILS
+from .forms import PostForm
+from .models import Group, Post, User
+from .utils import get_paginator
+
+# Карточка поста из posts/index.html
+CARD = Template('''{% load post_images %}
+  <article>
+    <ul>
+      <li>
+        Автор: {{ post.author.get_full_name }}
+        <a href="{% url 'posts:profile' post.author.username %}">все посты пользователя</a>
+      </li>
+      <li>Дата публикации: {{ post.pub_date|date:"d E Y" }}</li>
+    </ul>
+    {% post_image post %}
+    <p>
+      {{ post.text }}
+    </p>
+    <a href="{% url 'posts:post_detail' post.pk %}">подробная информация</a>
+  </article>
+    {% if post.group %}
+      <a href="{% url 'posts:group_posts' post.group.slug %}">все записи группы {{ post.group }}</a>
+    {% endif %}
+''')  # noqa: E501
+
+
+def _post(with_image=True):
+    author = User(pk=1, username='bench', first_name='Лев', last_name='Т.')
+    group = Group(pk=1, title='Группа', slug='bench')
+    post = Post(
+        pk=1, author=author, group=group,
+        text='Текст поста ' * 20, pub_date=timezone.now()
+    )
+    post.thumbnails = []
+    if with_image:
+        for geometry, options in POST_THUMBNAILS:
+            thumbnail = ImageFile(
+                f'cache/bench/{geometry}.jpg', default.storage
+            )
+            thumbnail.set_size(
+                tuple(int(side) for side in geometry.split('x'))
+            )
+            post.thumbnails.append(thumbnail)
+    return post
+
+
+def card():
+    context = Context({'post': _post()})
+    return lambda: CARD.render(context)
+
+
+def card_without_image():
+    context = Context({'post': _post(with_image=False)})
+    return lambda: CARD.render(context)
+
+
+def post_image_tag():
+    template = Template('{% load post_images %}{% post_image post %}')
+    context = Context({'post': _post()})
+    return lambda: template.render(context)
+
+
+def url_tag():
+    template = Template("{% url 'posts:profile' username %}")
+    context = Context({'username': 'bench'})
+    return lambda: template.render(context)
+
+
+def date_filter():
+    template = Template('{{ date|date:"d E Y" }}')
+    context = Context({'date': timezone.now()})
+    return lambda: template.render(context)
+
+
+def addclass_filter():
+    template = Template(
+        '{% load user_filters %}{{ form.text|addclass:"form-control" }}'
+    )
+    context = Context({'form': PostForm()})
+    return lambda: template.render(context)
+
+
+def post_from_db():
+    """Создание одного Post из строки, как при чтении ленты."""
+    fields = [field.attname for field in Post._meta.concrete_fields]
+    post = _post()
+    values = tuple(getattr(post, name) for name in fields)
+    return lambda: Post.from_db('default', fields, values)
+
+
+def paginator_in_memory():
+    objects = list(range(1000))
+    return lambda: list(Paginator(objects, 10).page(50))
+
+
+def feed_page():
+    """Первая страница ленты через CursorPaginator; нужны посты в базе."""
+    request = RequestFactory().get('/')
+    return lambda: list(get_paginator(Post.objects.for_feed(), request))
+
+
+CASES = {
+    'card': card,
+    'card_without_image': card_without_image,
+    'post_image_tag': post_image_tag,
+    'url_tag': url_tag,
+    'date_filter': date_filter,
+    'addclass_filter': addclass_filter,
+    'post_from_db': post_from_db,
+    'paginator_in_memory': paginator_in_memory,
+    'feed_page': feed_page,
+}
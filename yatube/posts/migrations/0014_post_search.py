@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Имя таблицы и SQL скопированы из posts.search на момент миграции:
+# миграция не должна зависеть от того, как модуль изменится потом
+TABLE = 'posts_search'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE {TABLE} '
+        "USING fts5(text, tokenize = 'unicode61')"
+    )
+    # Основы слов считает код приложения, поэтому здесь в индекс
+    # попадает исходный текст: префиксные запросы по основам находят и
+    # полные слова. Точный индекс строит manage.py rebuild_search
+    Post = apps.get_model('posts', 'Post')
+    schema_editor.execute(
+        f'INSERT INTO {TABLE} (rowid, text) '
+        f'SELECT id, text FROM {Post._meta.db_table}'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_image_blobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,32 @@
+import re
+
+from django.db import migrations
+from django.db.models import Count
+
+# Копия posts.storage.BLOB_NAME: миграция не зависит от живого кода
+BLOB_NAME = re.compile(r'^posts/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def count_references(apps, schema_editor):
+    # Посты, сохранённые до 0013 или через bulk_create, не учтены
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    rows = Post.objects.exclude(image='').order_by('image').values(
+        'image'
+    ).annotate(amount=Count('pk'))
+    for row in rows.iterator():
+        if BLOB_NAME.match(row['image']):
+            ImageBlob.objects.update_or_create(
+                name=row['image'], defaults={'ref_count': row['amount']}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_comment_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_feed_entry_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='source_id',
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name='Ключ записи импорта'
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def counted(model, field, outer):
+    # Число строк model, у которых field равно outer внешнего запроса
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)}).order_by().values(
+            field
+        ).annotate(amount=Count('pk')).values('amount'),
+        output_field=models.IntegerField()
+    ), 0)
+
+
+def create_missing_stats(AuthorStats, user_ids):
+    batch = []
+    for user_id in user_ids:
+        batch.append(AuthorStats(user_id=user_id))
+        if len(batch) >= BATCH_SIZE:
+            AuthorStats.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        AuthorStats.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_counters(apps, schema_editor):
+    # Счётчики из 0010 ведут сигналы только для новых записей; строки,
+    # созданные до неё, пересчитываются здесь одним проходом
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    for model, field in (
+        (Post, 'author_id'), (Follow, 'author_id'), (Follow, 'user_id')
+    ):
+        create_missing_stats(AuthorStats, model.objects.order_by().values_list(
+            field, flat=True
+        ).distinct().iterator(chunk_size=BATCH_SIZE))
+    AuthorStats.objects.update(
+        posts_count=counted(Post, 'author', 'user_id'),
+        followers_count=counted(Follow, 'author', 'user_id'),
+        following_count=counted(Follow, 'user', 'user_id'),
+    )
+    Post.objects.update(comments_count=counted(Comment, 'post', 'pk'))
+    # 0017 отмечала авторов без рассылки по ещё не пересчитанным
+    # followers_count
+    limit = getattr(settings, 'POSTS_FEED_FANOUT_LIMIT', 5000)
+    if limit is not None:
+        AuthorStats.objects.filter(followers_count__gt=limit).update(
+            pull_feed=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_comment_source_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
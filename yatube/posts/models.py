@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import image_storage
+
 User = get_user_model()
 
 
@@ -16,6 +18,29 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: авторы и группы одним запросом, без лишних колонок.
+
+        Число комментариев берётся из денормализованного comments_count.
+        """
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'image',
+            'image_width',
+            'image_height',
+            'placeholder_color',
+            'placeholder',
+            'comments_count',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__title',
+            'group__slug',
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -45,13 +70,75 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_bytes = models.PositiveIntegerField(
+        'Размер картинки в байтах',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    placeholder_color = models.CharField(
+        'Основной цвет картинки',
+        max_length=7,
+        blank=True,
+        editable=False
+    )
+    placeholder = models.TextField(
+        'Превью-заглушка картинки',
+        blank=True,
+        editable=False
+    )
+
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    # Повторный импорт того же файла не дублирует посты
+    source_id = models.CharField(
+        'Ключ записи импорта',
+        max_length=64,
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Курсорная пагинация идёт по ключу (pub_date, id) внутри ленты
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_feed_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -76,6 +163,23 @@ class Comment(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    # Повторный импорт того же файла не дублирует комментарии
+    source_id = models.CharField(
+        'Ключ записи импорта',
+        max_length=64,
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'],
+                name='comment_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -89,3 +193,68 @@ class Follow(models.Model):
         related_name='following',
         on_delete=models.CASCADE,
     )
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать COUNT(*)."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+    # Однажды вышедший за FEED_FANOUT_LIMIT автор навсегда читается при
+    # открытии ленты: посты, не разосланные в это время, не пропадут
+    pull_feed = models.BooleanField('Лента без рассылки', default=False)
+
+
+class FeedEntry(models.Model):
+    """Пост, заранее разосланный в ленту подписчика."""
+    user = models.ForeignKey(
+        User,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    # Копия Post.pub_date: лента листается по индексу без JOIN с постами
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_entry_user_author_idx'
+            ),
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_entry_user_date_idx'
+            ),
+        ]
+
+
+class ImageBlob(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField(max_length=100, primary_key=True)
+    ref_count = models.PositiveIntegerField('Число ссылок', default=0)
+    updated_at = models.DateTimeField(auto_now=True)
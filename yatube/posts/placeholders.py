@@ -0,0 +1,71 @@
+"""Заглушки картинок постов (LQIP).
+
+Пока грузится миниатюра, карточка показывает основной цвет картинки и
+размытое превью в несколько десятков пикселей. Оба значения считаются
+один раз после загрузки, хранятся в строке поста и вставляются в
+страницу прямо в разметку, без отдельного запроса за файлом.
+"""
+import base64
+from io import BytesIO
+
+from PIL import Image
+
+from core import page_cache
+
+from . import feed_cache
+from .conf import PLACEHOLDER_QUALITY, PLACEHOLDER_SIDE
+from .models import Post
+from .storage import image_storage
+from .utils import post_pages
+
+# До скольки цветов сжимается палитра при поиске основного
+PALETTE_COLORS = 8
+
+
+def dominant_color(image):
+    sample = image.copy()
+    sample.thumbnail((64, 64))
+    palette = sample.quantize(colors=PALETTE_COLORS)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def compute_placeholder(file_obj):
+    """Возвращает (цвет '#rrggbb', превью в виде data: URI)."""
+    with Image.open(file_obj) as image:
+        image.draft('RGB', (PLACEHOLDER_SIDE, PLACEHOLDER_SIDE))
+        image = image.convert('RGB')
+    color = dominant_color(image)
+    image.thumbnail((PLACEHOLDER_SIDE, PLACEHOLDER_SIDE))
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    preview = base64.b64encode(output.getvalue()).decode()
+    return color, 'data:image/jpeg;base64,' + preview
+
+
+def store_placeholder(name):
+    """Считает заглушку файла name и записывает её во все его посты."""
+    with image_storage.open(name) as file_obj:
+        color, preview = compute_placeholder(file_obj)
+    # update() без сигналов: заглушка не меняет содержимого поста,
+    # но меняет разметку карточек, поэтому кэш сбрасывается отдельно
+    updated = Post.objects.filter(image=name).update(
+        placeholder_color=color,
+        placeholder=preview
+    )
+    if updated:
+        refresh_pages(name)
+    return updated
+
+
+def refresh_pages(name):
+    """Сбрасывает страницы и ленты всех постов с картинкой name.
+
+    Вызывается и из процесса пула миниатюр: сброс виден сайту, только
+    если кэш общий для процессов (не locmem).
+    """
+    posts = Post.objects.filter(image=name).select_related('author', 'group')
+    for post in posts:
+        page_cache.purge(*post_pages(post))
+        feed_cache.bump_generation(*feed_cache.post_feeds(post))
@@ -0,0 +1,179 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+В виртуальную таблицу posts_search кладётся не исходный текст поста, а
+его основы слов: стеммер Snowball для русского языка отрезает окончания,
+поэтому «котами» находит «кот» и «коты». Запрос проходит тот же путь.
+Таблица обновляется сигналами; после bulk_create или ручных правок базы
+её пересобирает ``manage.py rebuild_search``.
+"""
+import base64
+import re
+
+from django.db import connection
+
+TABLE = 'posts_search'
+WORD = re.compile(r'\w+')
+
+_PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+_REFLEXIVE = re.compile(r'(с[яь])$')
+_ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+_PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+_VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+_RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+_DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка."""
+    word = word.lower().replace('ё', 'е')
+    match = _RV.match(word)
+    if not match:
+        return word
+    start, rv = match.groups()
+    stripped = _PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = _REFLEXIVE.sub('', rv, 1)
+        stripped = _ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = _PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = _VERB.sub('', rv, 1)
+            rv = _NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+    rv = re.sub('и$', '', rv, 1)
+    if _DERIVATIONAL.match(rv):
+        rv = re.sub('ость?$', '', rv, 1)
+    stripped = re.sub('ь$', '', rv, 1)
+    if stripped == rv:
+        rv = _SUPERLATIVE.sub('', rv, 1)
+        rv = re.sub('нн$', 'н', rv, 1)
+    else:
+        rv = stripped
+    return start + rv
+
+
+def normalize(text):
+    return ' '.join(stem(word) for word in WORD.findall(text))
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе MATCH: все основы, как префиксы."""
+    return ' '.join(f'"{stem(word)}"*' for word in WORD.findall(query))
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post_id, text):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [post_id, normalize(text)]
+        )
+
+
+def remove_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild(posts, batch_size=1000):
+    """Заполняет индекс заново из пар (id, текст); возвращает их число."""
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        batch = []
+        for post_id, text in posts:
+            batch.append((post_id, normalize(text)))
+            if len(batch) >= batch_size:
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)', batch
+                )
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)', batch
+            )
+            total += len(batch)
+    return total
+
+
+def matching_sql(query):
+    """Подзапрос с id подходящих постов - для filter(pk__in=RawSQL(...))."""
+    return (
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+        [match_expression(query)]
+    )
+
+
+def encode_cursor(score, post_id):
+    return base64.urlsafe_b64encode(f'{score!r}|{post_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        score, post_id = base64.urlsafe_b64decode(
+            cursor.encode()
+        ).decode().split('|')
+        return float(score), int(post_id)
+    except (TypeError, ValueError, UnicodeError):
+        return None
+
+
+def search(query, after=None, limit=10):
+    """Id постов по убыванию релевантности и курсор следующей страницы.
+
+    Курсор - пара (оценка bm25, id) последнего поста на странице, и
+    следующая страница выбирается по ключу, без OFFSET. Листание
+    приблизительное: bm25 зависит от статистики всей таблицы (числа
+    постов, средней длины, частоты слова), поэтому новый или изменённый
+    пост между запросами сдвигает оценки остальных, и на границе
+    страниц пост может повториться или пропасть.
+    """
+    expression = match_expression(query)
+    if not expression or not is_available():
+        return [], None
+    sql = (
+        f'SELECT rowid, bm25({TABLE}) AS score FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s'
+    )
+    params = [expression]
+    if after is not None:
+        score, post_id = after
+        sql = (
+            f'SELECT rowid, score FROM ({sql}) '
+            'WHERE score > %s OR (score = %s AND rowid < %s)'
+        )
+        params += [score, score, post_id]
+    sql += ' ORDER BY score, rowid DESC LIMIT %s'
+    params.append(limit + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    return [post_id for post_id, score in rows], next_cursor
@@ -0,0 +1,153 @@
+"""Генерация объёмных данных для замеров производительности.
+
+Тексты и имена берутся из небольшого пула, заранее созданного Faker:
+вызывать Faker на каждую из миллионов строк дольше, чем сама запись.
+mixer создаёт объекты по одному через save(), поэтому строки здесь
+пишутся bulk_create пачками с заранее известными id - так комментарии
+и подписки ссылаются на них без дополнительных запросов.
+"""
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from .bulk import keep_date, refresh_derived
+from .models import Comment, Follow, Group, Post, User
+
+SCALES = {
+    'tiny': {
+        'users': 20, 'groups': 3, 'posts': 200,
+        'comments': 400, 'follows': 100,
+    },
+    'small': {
+        'users': 1_000, 'groups': 20, 'posts': 50_000,
+        'comments': 100_000, 'follows': 20_000,
+    },
+    'medium': {
+        'users': 10_000, 'groups': 100, 'posts': 500_000,
+        'comments': 1_000_000, 'follows': 1_000_000,
+    },
+    'large': {
+        'users': 10_000, 'groups': 1_000, 'posts': 5_000_000,
+        'comments': 10_000_000, 'follows': 50_000_000,
+    },
+}
+POOL_SIZE = 500
+# За сколько дней до сейчас распределяются даты постов
+SPAN_DAYS = 365 * 3
+
+
+def _next_id(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+class Seeder:
+    def __init__(self, batch_size=5000, seed=0, stdout=None):
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.stdout = stdout
+        faker = Faker('ru_RU')
+        faker.seed_instance(seed)
+        self.texts = [faker.text(max_nb_chars=400) for _ in range(POOL_SIZE)]
+        self.first_names = [faker.first_name() for _ in range(POOL_SIZE)]
+        self.last_names = [faker.last_name() for _ in range(POOL_SIZE)]
+        self.words = [faker.word() for _ in range(POOL_SIZE)]
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def _write(self, model, objects):
+        """Пишет объекты пачками, каждая в своей транзакции."""
+        batch = []
+        written = 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            written += len(batch)
+        self.log(f'{model.__name__}: {written}')
+
+    def seed(self, users, groups, posts, comments, follows, derived=True):
+        first_user, first_group = _next_id(User), _next_id(Group)
+        first_post = _next_id(Post)
+        user_ids = range(first_user, first_user + users)
+        group_ids = range(first_group, first_group + groups)
+        post_ids = range(first_post, first_post + posts)
+        choice = self.random.choice
+
+        self._write(User, (
+            User(
+                pk=pk,
+                username=f'bench-{pk}',
+                first_name=choice(self.first_names),
+                last_name=choice(self.last_names),
+                password='!',
+            )
+            for pk in user_ids
+        ))
+        self._write(Group, (
+            Group(
+                pk=pk,
+                title=f'{choice(self.words)} {pk}',
+                slug=f'bench-{pk}',
+                description=choice(self.texts),
+            )
+            for pk in group_ids
+        ))
+        now = timezone.now()
+        span = SPAN_DAYS * 24 * 60 * 60
+        self._write(Post, (
+            keep_date(Post(
+                pk=pk,
+                author_id=choice(user_ids),
+                group_id=(
+                    choice(group_ids)
+                    if group_ids and self.random.random() < 0.7
+                    else None
+                ),
+                text=choice(self.texts),
+                pub_date=now - timedelta(
+                    seconds=self.random.randrange(span)
+                ),
+            ))
+            for pk in post_ids
+        ))
+        self._write(Comment, (
+            keep_date(Comment(
+                post_id=choice(post_ids),
+                author_id=choice(user_ids),
+                text=choice(self.texts)[:200],
+                created=now,
+            ))
+            for _ in range(comments if post_ids else 0)
+        ))
+        self._write(Follow, self._follows(user_ids, follows))
+        if derived:
+            self.log('Пересчёт счётчиков, поиска и лент...')
+            refresh_derived(user_ids, self.stdout)
+
+    def _follows(self, user_ids, amount):
+        """Уникальные пары (подписчик, автор) без подписок на себя."""
+        if len(user_ids) < 2:
+            return
+        per_user = min(amount // len(user_ids) + 1, len(user_ids) - 1)
+        produced = 0
+        for user_id in user_ids:
+            authors = self.random.sample(user_ids, per_user + 1)
+            for author_id in authors:
+                if produced >= amount:
+                    return
+                if author_id == user_id:
+                    continue
+                yield Follow(user_id=user_id, author_id=author_id)
+                produced += 1
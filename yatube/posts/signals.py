@@ -0,0 +1,163 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core import page_cache
+
+from . import blobs, counters, feed_cache, search, timeline
+from .models import Comment, Follow, Group, Post
+from .utils import author_pages_tag, group_pages, post_pages
+
+
+@receiver([post_save, post_delete], sender=Post)
+def purge_post_pages(sender, instance, created=True, **kwargs):
+    page_cache.purge(*post_pages(instance))
+    # Пост перенесли в другую группу - из админки, формы или save()
+    previous_group = getattr(instance, '_previous_group', None)
+    if previous_group is not None and (
+        instance.group_id is None or previous_group != instance.group.slug
+    ):
+        page_cache.purge(*group_pages(previous_group))
+    if created:
+        # Число постов автора видно на страницах всех его постов
+        page_cache.purge_tags(author_pages_tag(instance.author_id))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def purge_comment_pages(sender, instance, **kwargs):
+    page_cache.purge(
+        reverse('posts:post_detail', args=[instance.post_id])
+    )
+
+
+@receiver([post_save, post_delete], sender=Group)
+def purge_group_pages(sender, instance, **kwargs):
+    page_cache.purge(*group_pages(instance.slug))
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def purge_follow_pages(sender, instance, **kwargs):
+    page_cache.purge(
+        reverse('posts:profile', args=[instance.user.username]),
+        reverse('posts:profile', args=[instance.author.username]),
+    )
+
+
+@receiver([post_save, post_delete], sender=Post)
+def bump_post_feeds(sender, instance, created=True, **kwargs):
+    feeds = feed_cache.post_feeds(instance)
+    previous_group = getattr(instance, '_previous_group', None)
+    if previous_group is not None:
+        feeds.append(feed_cache.group_feed(previous_group))
+    if created:
+        # Новый или удалённый пост меняет число постов автора
+        feeds.append(feed_cache.author_counts_feed(instance.author_id))
+    feed_cache.bump_generation(*feeds)
+
+
+@receiver(post_save, sender=Post)
+def remember_post_author(sender, instance, created, **kwargs):
+    if created:
+        feed_cache.remember_author(instance)
+
+
+@receiver(post_delete, sender=Post)
+def forget_post_author(sender, instance, **kwargs):
+    # id поста может достаться новому посту при импорте с явными id
+    feed_cache.forget_post(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def bump_comment_feeds(sender, instance, **kwargs):
+    # В карточках поста в API есть число комментариев
+    feed_cache.bump_generation(*feed_cache.post_feeds(instance.post))
+
+
+@receiver([post_save, post_delete], sender=Group)
+def bump_group_feeds(sender, **kwargs):
+    # Название группы видно в карточках всех лент
+    feed_cache.bump_generation(feed_cache.ALL)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def bump_follow_feeds(sender, instance, **kwargs):
+    feed_cache.bump_generation(
+        feed_cache.follow_feed(instance.user_id),
+        feed_cache.author_feed(instance.user.username),
+        feed_cache.author_feed(instance.author.username),
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_author(instance.author_id, 'posts_count', 1)
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_author(instance.user_id, 'following_count', 1)
+        counters.bump_author(instance.author_id, 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.user_id, 'following_count', -1)
+    counters.bump_author(instance.author_id, 'followers_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, **kwargs):
+    # Старые картинка и группа нужны счётчику ссылок и кэшу лент
+    instance._previous_image = instance._previous_group = None
+    if instance.pk is None:
+        return
+    previous = Post.objects.filter(pk=instance.pk).values_list(
+        'image', 'group__slug'
+    ).first()
+    if previous is not None:
+        instance._previous_image, instance._previous_group = previous
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if instance.image.name != previous:
+        blobs.retain(instance.image.name)
+        blobs.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    blobs.release(instance.image.name)
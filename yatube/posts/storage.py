@@ -0,0 +1,61 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл получает имя по SHA-256 своего содержимого, который считается
+прямо во время записи, без второго прохода по данным. Одинаковые
+картинки попадают в один файл, а значит и в один набор миниатюр sorl.
+Сколько постов ссылается на файл, хранит ImageBlob (см. blobs.py).
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_NAME = re.compile(r'^posts/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def is_blob(name):
+    return bool(name) and BLOB_NAME.match(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Исходное имя всё равно заменится хэшем содержимого
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.location, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:2], hexdigest + extension
+            )
+            path = self.path(name)
+            if os.path.exists(path):
+                # Свежее время изменения защищает файл от сборщика мусора,
+                # пока пост со ссылкой на него ещё не сохранён
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, path)
+                temp_path = None
+        finally:
+            if temp_path is not None:
+                os.remove(temp_path)
+        return name
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,63 @@
+from django import template
+from django.utils.html import format_html
+
+from ..conf import POST_THUMBNAILS
+
+register = template.Library()
+
+SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+def _size(thumbnail, geometry):
+    # У ненайденной миниатюры размера нет, берём его из геометрии
+    if thumbnail.size:
+        return thumbnail.size
+    return tuple(int(side) for side in geometry.split('x'))
+
+
+def _placeholder_style(post):
+    # Заглушка видна фоном, пока не загрузится сама картинка
+    color = getattr(post, 'placeholder_color', '')
+    if not color:
+        return ''
+    background = color
+    if post.placeholder:
+        background += f' url({post.placeholder}) center / cover no-repeat'
+    return format_html(' style="background: {}"', background)
+
+
+@register.simple_tag
+def post_image(post, lazy=True):
+    """Картинка поста со srcset из вариантов, найденных resolve_thumbnails."""
+    thumbnails = getattr(post, 'thumbnails', None)
+    if not thumbnails:
+        return ''
+    srcset = ''
+    if len(thumbnails) == len(POST_THUMBNAILS):
+        sizes = [
+            _size(thumbnail, geometry)
+            for thumbnail, (geometry, options)
+            in zip(thumbnails, POST_THUMBNAILS)
+        ]
+        srcset = format_html(
+            ' srcset="{}" sizes="{}"',
+            ', '.join(
+                f'{thumbnail.url} {width}w'
+                for thumbnail, (width, height) in zip(thumbnails, sizes)
+            ),
+            SIZES,
+        )
+    else:
+        # Миниатюры ещё строятся: только исходная картинка
+        sizes = [_size(thumbnails[-1], POST_THUMBNAILS[-1][0])]
+    width, height = sizes[-1]
+    return format_html(
+        '<img class="card-img my-2" src="{}"{} '
+        'width="{}" height="{}" loading="{}"{} alt="">',
+        thumbnails[-1].url,
+        srcset,
+        width,
+        height,
+        'lazy' if lazy else 'eager',
+        _placeholder_style(post),
+    )
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ScalableAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.group = Group.objects.create(
+            title='test-title',
+            slug='test-slug',
+            description='test-description'
+        )
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+
+    def add_rows(self, amount):
+        authors = User.objects.bulk_create([
+            User(username=f'author-{Post.objects.count()}-{i}')
+            for i in range(amount)
+        ])
+        for author in User.objects.filter(
+            username__in=[author.username for author in authors]
+        ):
+            post = Post.objects.create(
+                author=author, group=self.group, text='test-text'
+            )
+            Comment.objects.create(author=author, post=post, text='test')
+
+    def changelist_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin_client.get(
+                reverse(f'admin:posts_{name}_changelist')
+            )
+        self.assertEqual(response.status_code, 200)
+        return queries
+
+    def test_changelists_do_not_grow_with_rows(self):
+        for name in ('post', 'comment'):
+            with self.subTest(name=name):
+                self.add_rows(2)
+                before = len(self.changelist_queries(name))
+                self.add_rows(5)
+                self.assertEqual(len(self.changelist_queries(name)), before)
+
+    def test_no_count_over_whole_table(self):
+        self.add_rows(3)
+        queries = self.changelist_queries('post')
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT COUNT(*)')
+            and 'posts_post' in query['sql']
+        ])
+        response = self.admin_client.get(
+            reverse('admin:posts_post_changelist')
+        )
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_group_is_editable_in_changelist(self):
+        self.add_rows(1)
+        response = self.admin_client.get(
+            reverse('admin:posts_post_changelist')
+        )
+        self.assertContains(response, 'name="form-0-group"')
+        self.assertContains(response, f'value="{self.group.pk}"')
+        self.assertContains(response, self.group.title)
+        # Ни одной строки со списком всех групп
+        self.assertNotContains(response, f'<option value="{self.group.pk}"')
+        other = Group.objects.create(title='other', slug='other')
+        post = Post.objects.get()
+        self.admin_client.post(reverse('admin:posts_post_changelist'), {
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '1',
+            'form-0-id': post.pk,
+            'form-0-group': other.pk,
+            '_save': 'Сохранить',
+        })
+        post.refresh_from_db()
+        self.assertEqual(post.group, other)
@@ -0,0 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..conf import POSTS_COUNT
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class PostApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test-title',
+            slug='test-slug',
+            description='test-description'
+        )
+        for i in range(POSTS_COUNT + 2):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'test-text {i}'
+            )
+        cls.post = Post.objects.latest('pk')
+        for i in range(POSTS_COUNT + 1):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'comment {i}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def get_json(self, name, params=None, client=None, **kwargs):
+        response = (client or self.client).get(
+            reverse(f'posts:{name}', kwargs=kwargs), params or {}
+        )
+        return response.status_code, response.json()
+
+    def test_feeds_page_with_cursor(self):
+        feeds = (
+            ('api_index', {}),
+            ('api_group_posts', {'slug': 'test-slug'}),
+            ('api_profile', {'username': 'NoName'}),
+            ('api_follow_index', {}),
+        )
+        for name, kwargs in feeds:
+            with self.subTest(name=name):
+                status, data = self.get_json(
+                    name, client=self.reader_client, **kwargs
+                )
+                self.assertEqual(status, 200)
+                self.assertEqual(len(data['results']), POSTS_COUNT)
+                status, data = self.get_json(
+                    name, {'after': data['next']},
+                    client=self.reader_client, **kwargs
+                )
+                self.assertEqual(len(data['results']), 2)
+                self.assertIsNone(data['next'])
+
+    def test_sparse_fields_narrow_query(self):
+        with self.assertNumQueries(1):
+            status, data = self.get_json('api_index', {'fields': 'id,text'})
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        status, data = self.get_json(
+            'api_index', {'fields': 'author,group,comments_count'}
+        )
+        self.assertEqual(data['results'][0], {
+            'author': 'NoName',
+            'group': 'test-slug',
+            'comments_count': POSTS_COUNT + 1,
+        })
+
+    def test_sparse_fields_select_only_requested_columns(self):
+        feeds = (
+            ('api_index', {}, 'posts_post', 'pub_date'),
+            ('api_group_posts', {'slug': 'test-slug'}, 'posts_post',
+             'pub_date'),
+            ('api_profile', {'username': 'NoName'}, 'posts_post', 'pub_date'),
+            ('api_comments', {'post_id': self.post.pk}, 'posts_comment',
+             'created'),
+        )
+        for name, kwargs, table, date_field in feeds:
+            with self.subTest(name=name):
+                with CaptureQueriesContext(connection) as queries:
+                    self.get_json(name, {'fields': 'id'}, **kwargs)
+                selects = [
+                    query['sql'] for query in queries
+                    if query['sql'].startswith(f'SELECT "{table}"."id"')
+                ]
+                self.assertEqual(len(selects), 1)
+                columns = selects[0].split(' FROM ')[0]
+                self.assertEqual(
+                    columns,
+                    f'SELECT "{table}"."id", "{table}"."{date_field}"'
+                )
+                self.assertNotIn('JOIN', selects[0])
+
+    def test_unknown_field_is_rejected(self):
+        status, data = self.get_json('api_index', {'fields': 'password'})
+        self.assertEqual(status, 400)
+        self.assertIn('password', data['error'])
+
+    def test_post_detail_and_comments(self):
+        status, data = self.get_json(
+            'api_post_detail', post_id=self.post.pk
+        )
+        self.assertEqual(data['text'], self.post.text)
+        status, data = self.get_json('api_comments', post_id=self.post.pk)
+        self.assertEqual(data['results'][0]['text'], 'comment 0')
+        status, data = self.get_json(
+            'api_comments', {'after': data['next']}, post_id=self.post.pk
+        )
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            [f'comment {POSTS_COUNT}']
+        )
+
+    def test_errors(self):
+        status, _ = self.get_json('api_follow_index')
+        self.assertEqual(status, 401)
+        status, _ = self.get_json('api_post_detail', post_id=0)
+        self.assertEqual(status, 404)
@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from ..models import Follow, Post, User
+from ..microbench import CASES
+from ..seed import SCALES
+
+VIEWS = (
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+)
+
+
+class BenchmarkViewsTests(TestCase):
+    def setUp(self):
+        self.output = tempfile.NamedTemporaryFile(suffix='.json').name
+
+    def tearDown(self):
+        if os.path.exists(self.output):
+            os.remove(self.output)
+
+    def run_benchmark(self, **options):
+        call_command(
+            'benchmark_views', requests=3, warmup=1,
+            stdout=StringIO(), stderr=StringIO(), **options
+        )
+
+    def test_seed_and_measure(self):
+        self.run_benchmark(seed='tiny', output=self.output)
+        tiny = SCALES['tiny']
+        self.assertEqual(User.objects.count(), tiny['users'])
+        self.assertEqual(Post.objects.count(), tiny['posts'])
+        self.assertEqual(Follow.objects.count(), tiny['follows'])
+        with open(self.output) as file_obj:
+            results = json.load(file_obj)
+        self.assertEqual(set(results), set(VIEWS))
+        for name in VIEWS:
+            with self.subTest(name=name):
+                summary = results[name]
+                self.assertLessEqual(summary['p50'], summary['p99'])
+                self.assertGreater(summary['queries'], 0)
+                self.assertGreater(summary['peak_kb'], 0)
+
+    def test_baseline_regression_fails(self):
+        self.run_benchmark(seed='tiny', output=self.output)
+        with open(self.output) as file_obj:
+            results = json.load(file_obj)
+        for summary in results.values():
+            summary['queries'] = 0
+        with open(self.output, 'w') as file_obj:
+            json.dump(results, file_obj)
+        with self.assertRaises(CommandError):
+            self.run_benchmark(baseline=self.output)
+
+
+class MicrobenchTests(TestCase):
+    def test_all_cases_are_measured(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'microbench', warmup=0, repeats=2, number=2,
+                output=output.name, stdout=StringIO()
+            )
+            results = json.load(output)
+        self.assertEqual(set(results), set(CASES))
+        self.assertEqual(results['card']['runs'], 2)
+
+    def test_card_renders_srcset(self):
+        self.assertIn('srcset=', CASES['card']()())
@@ -0,0 +1,63 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..counters import stats_for
+from ..models import AuthorStats, Comment, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.post = Post.objects.create(author=cls.author, text='test-text')
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def get_stats(self, user):
+        return stats_for(User.objects.get(pk=user.pk))
+
+    def test_post_and_comment_counters(self):
+        self.assertEqual(self.get_stats(self.author).posts_count, 1)
+        self.follower_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'test-comment'}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        Comment.objects.all().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_follow_counters(self):
+        follow_url = reverse(
+            'posts:profile_follow', kwargs={'username': self.author}
+        )
+        self.follower_client.get(follow_url)
+        self.follower_client.get(follow_url)
+        self.assertEqual(self.get_stats(self.author).followers_count, 1)
+        self.assertEqual(self.get_stats(self.follower).following_count, 1)
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}
+        ))
+        self.assertEqual(self.get_stats(self.author).followers_count, 0)
+        self.assertEqual(self.get_stats(self.follower).following_count, 0)
+
+    def test_recount_fixes_drift(self):
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=3)
+        out = StringIO()
+        call_command('recount', '--dry-run', stdout=out)
+        self.assertIn('пользователей: 1, у постов: 1', out.getvalue())
+        self.assertEqual(self.get_stats(self.author).posts_count, 7)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.get_stats(self.author).posts_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
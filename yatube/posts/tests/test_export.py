@@ -0,0 +1,75 @@
+import csv
+import json
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(
+            author=cls.author, text='test-text', image='posts/test.jpg'
+        )
+        Post.objects.create(author=cls.other, text='чужой пост')
+        Comment.objects.create(post=cls.post, author=cls.author, text='ок')
+        Follow.objects.create(user=cls.author, author=cls.other)
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+
+    def export(self, client, data_format='jsonl', username='NoName'):
+        return client.get(
+            reverse('posts:profile_export', kwargs={'username': username}),
+            {'format': data_format}
+        )
+
+    def test_jsonl_export_is_streamed(self):
+        response = self.export(self.author_client)
+        self.assertTrue(response.streaming)
+        records = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['post', 'comment', 'follow']
+        )
+        self.assertEqual(records[0]['image'], 'posts/test.jpg')
+        self.assertEqual(records[0]['image_url'], '/media/posts/test.jpg')
+
+    def test_csv_export(self):
+        response = self.export(self.author_client, 'csv')
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(rows[0]['text'], 'test-text')
+        self.assertEqual(len(rows), 3)
+
+    def test_only_owner_can_export(self):
+        response = self.export(self.author_client, username='other')
+        self.assertEqual(response.status_code, 403)
+
+    def test_site_dump_round_trips_through_import(self):
+        out = StringIO()
+        call_command('export_content', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as dump:
+            dump.write(out.getvalue())
+            dump.flush()
+            Post.objects.all().delete()
+            Follow.objects.all().delete()
+            call_command('import_content', dump.name, stdout=StringIO())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.image.name, 'posts/test.jpg')
+        self.assertEqual(post.comments.get().text, 'ок')
+        self.assertTrue(Follow.objects.filter(user=self.author).exists())
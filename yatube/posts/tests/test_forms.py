@@ -1,17 +1,29 @@
+import hashlib
+import os
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.conf import settings
+from PIL import Image
+from django.core.cache import cache
+from django.core.management import call_command
+from sorl.thumbnail import get_thumbnail
 
+from .. import uploads
 from ..forms import PostForm
 from ..models import Post, Group
+from ..storage import is_blob
+from ..thumbnails import (
+    generate_thumbnails, process_image, resolve_thumbnails
+)
 
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 User = get_user_model()
 
@@ -67,10 +79,10 @@ class PostFormTests(TestCase):
             follow=True
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(Post.objects.filter(
-            text='test-post-text',
-            image='posts/small.gif').exists()
-        )
+        post = Post.objects.get(text='test-post-text')
+        with post.image.open() as file_obj:
+            digest = hashlib.sha256(file_obj.read()).hexdigest()
+        self.assertEqual(post.image.name, f'posts/{digest[:2]}/{digest}.gif')
 
     def test_edit_post(self):
         base_post = self.post
@@ -84,3 +96,232 @@ class PostFormTests(TestCase):
         )
         base_post_new = Post.objects.get(id=1)
         self.assertNotEqual(base_post.text, base_post_new.text)
+
+    def test_generate_thumbnails(self):
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=small_gif,
+            content_type='image/gif'
+        )
+        post = Post.objects.create(
+            author=self.author,
+            text='test-text',
+            image=uploaded
+        )
+        generate_thumbnails(post.image.name)
+        thumbnails_dir = os.path.join(TEMP_MEDIA_ROOT, 'cache')
+        self.assertTrue(os.listdir(thumbnails_dir))
+
+    def test_resolve_thumbnails_in_one_query(self):
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        # Одинаковое содержимое даёт тот же файл, что и в других тестах:
+        # записи sorl из их откатившихся транзакций остались только в кэше
+        cache.clear()
+        posts = []
+        for i in range(3):
+            post = Post.objects.create(
+                author=self.author,
+                text='test-text',
+                image=SimpleUploadedFile(
+                    name=f'resolve_{i}.gif',
+                    content=small_gif,
+                    content_type='image/gif'
+                )
+            )
+            generate_thumbnails(post.image.name)
+            posts.append(post)
+        cache.clear()
+        with self.assertNumQueries(1):
+            resolve_thumbnails(posts)
+        for post in posts:
+            with self.subTest(post=post.image.name):
+                expected = get_thumbnail(
+                    post.image, '960x339', crop='top', upscale=True
+                )
+                self.assertEqual(post.thumbnail.url, expected.url)
+
+    def test_post_image_has_srcset(self):
+        cache.clear()
+        post = Post.objects.create(
+            author=self.author,
+            text='test-text',
+            image=self.get_png((40, 20))
+        )
+        generate_thumbnails(post.image.name)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, ' 320w, ')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_missing_thumbnails_fall_back_to_original(self):
+        cache.clear()
+        post = Post.objects.create(
+            author=self.author,
+            text='test-text',
+            image=self.get_png((42, 21)),
+            image_width=42,
+            image_height=21
+        )
+        backend = 'sorl.thumbnail.base.ThumbnailBackend.get_thumbnail'
+        with mock.patch(backend) as build:
+            response = self.guest_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.pk})
+            )
+        build.assert_not_called()
+        self.assertNotContains(response, 'srcset=')
+        self.assertContains(response, f'src="{post.image.url}"')
+        self.assertContains(response, 'width="42" height="21"')
+
+    @staticmethod
+    def get_png(size, mode='RGB'):
+        file_obj = BytesIO()
+        Image.new(mode, size, color='red').save(file_obj, 'png')
+        return SimpleUploadedFile(
+            name='big.png',
+            content=file_obj.getvalue(),
+            content_type='image/png'
+        )
+
+    @staticmethod
+    def get_gif(frames, comment=b''):
+        file_obj = BytesIO()
+        images = [
+            Image.new('RGB', (4, 4), (index * 20 % 256, 0, 0))
+            for index in range(frames)
+        ]
+        images[0].save(
+            file_obj, 'gif', save_all=True, append_images=images[1:],
+            duration=50, loop=0, comment=comment
+        )
+        return SimpleUploadedFile(
+            name='anim.gif',
+            content=file_obj.getvalue(),
+            content_type='image/gif'
+        )
+
+    def test_gif_keeps_frames_without_metadata(self):
+        form = PostForm(
+            data={'text': 'test-gif'},
+            files={'image': self.get_gif(3, comment=b'secret')}
+        )
+        self.assertTrue(form.is_valid())
+        content = form.cleaned_data['image'].read()
+        self.assertNotIn(b'secret', content)
+        with Image.open(BytesIO(content)) as image:
+            self.assertEqual(image.n_frames, 3)
+
+    def test_gif_with_too_many_frames_rejected(self):
+        with mock.patch.object(uploads, 'GIF_MAX_FRAMES', 2):
+            form = PostForm(
+                data={'text': 'test-gif'},
+                files={'image': self.get_gif(3)}
+            )
+            self.assertFalse(form.is_valid())
+
+    def test_admin_upload_is_processed(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        client = Client()
+        client.force_login(admin)
+        with mock.patch.object(uploads, 'IMAGE_MAX_SIDE', 100):
+            client.post(reverse('admin:posts_post_add'), {
+                'text': 'test-admin',
+                'author': self.author.pk,
+                'image': self.get_png((300, 150)),
+            })
+        post = Post.objects.get(text='test-admin')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+
+    def test_large_upload_is_reencoded(self):
+        with mock.patch.object(uploads, 'IMAGE_MAX_SIDE', 100):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': 'test-reencode',
+                    'image': self.get_png((400, 200))
+                }
+            )
+        post = Post.objects.get(text='test-reencode')
+        self.assertTrue(is_blob(post.image.name))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        self.assertEqual(post.image_bytes, post.image.size)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (100, 50))
+
+    def test_transparent_upload_becomes_webp(self):
+        form = PostForm(
+            data={'text': 'test-webp'},
+            files={'image': self.get_png((20, 20), mode='RGBA')}
+        )
+        self.assertTrue(form.is_valid())
+        self.assertTrue(form.cleaned_data['image'].name.endswith('.webp'))
+
+    def test_placeholder_computed_after_upload(self):
+        post = Post.objects.create(
+            author=self.author,
+            text='test-text',
+            image=self.get_png((40, 20))
+        )
+        process_image(post.image.name)
+        post.refresh_from_db()
+        self.assertEqual(post.placeholder_color, '#ff0000')
+        self.assertTrue(post.placeholder.startswith('data:image/jpeg;base64,'))
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'style="background: #ff0000 url(data:')
+
+    def test_placeholder_purges_cached_pages(self):
+        cache.clear()
+        post = Post.objects.create(
+            author=self.author,
+            text='test-text',
+            image=self.get_png((40, 20))
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.guest_client.get(url)
+        etag = self.authorized_client.get(url)['ETag']
+        process_image(post.image.name)
+        self.assertContains(self.guest_client.get(url), 'background: #ff0000')
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_backfill_placeholders(self):
+        post = Post.objects.create(
+            author=self.author,
+            text='test-text',
+            image=self.get_png((40, 20))
+        )
+        call_command('backfill_placeholders', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.placeholder_color, '#ff0000')
+
+    def test_too_many_pixels_rejected(self):
+        with mock.patch.object(uploads, 'UPLOAD_MAX_PIXELS', 100):
+            form = PostForm(
+                data={'text': 'test-bomb'},
+                files={'image': self.get_png((20, 20))}
+            )
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
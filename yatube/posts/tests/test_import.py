@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Comment, FeedEntry, Follow, Group, ImageBlob, Post
+from ..storage import image_storage
+from .. import search
+from .test_storage import SMALL_GIF
+
+User = get_user_model()
+
+
+class ImportContentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.temp_dir = tempfile.mkdtemp()
+        User.objects.create_user(username='reader')
+        Group.objects.create(title='Кошки', slug='cats', description='')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
+    def write_records(self, name, records):
+        return self.write(name, '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records
+        ))
+
+    def write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as file_obj:
+            file_obj.write(content)
+        return path
+
+    def test_jsonl_import(self):
+        records = [
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+            {
+                'type': 'post', 'id': 500, 'author': 'writer',
+                'group': 'cats', 'text': 'Импортированные коты',
+                'pub_date': '2020-01-02T03:04:05',
+            },
+            {'type': 'comment', 'post': 500, 'author': 'reader',
+             'text': 'Отлично'},
+            {'type': 'unknown'},
+        ]
+        path = self.write('content.jsonl', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records
+        ))
+        err = StringIO()
+        call_command(
+            'import_content', path, create_missing=True, batch_size=2,
+            stdout=StringIO(), stderr=err
+        )
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.comments_count, 1)
+        self.assertTrue(Comment.objects.filter(post=post).exists())
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author__username='writer'
+        ).exists())
+        self.assertTrue(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(search.search('кот')[0], [500])
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+        self.assertIn('Запись 4', err.getvalue())
+
+    def test_csv_import_resumes_from_checkpoint(self):
+        path = self.write(
+            'content.csv',
+            'type,author,text\n'
+            'post,reader,первый\n'
+            'post,reader,второй\n'
+            'post,reader,третий\n'
+        )
+        with open(path + '.checkpoint', 'w') as file_obj:
+            file_obj.write('2')
+        call_command(
+            'import_content', path, skip_derived=True, stdout=StringIO()
+        )
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['третий']
+        )
+
+    def test_comment_to_missing_post_is_reported(self):
+        Post.objects.create(
+            pk=700, author=User.objects.get(username='reader'), text='пост'
+        )
+        path = self.write_records('comments.jsonl', (
+            {'type': 'comment', 'post': 999, 'author': 'reader', 'text': 'a'},
+            {'type': 'comment', 'post': 700, 'author': 'reader', 'text': 'b'},
+        ))
+        err = StringIO()
+        call_command(
+            'import_content', path, skip_derived=True,
+            stdout=StringIO(), stderr=err
+        )
+        self.assertIn('Запись 1: нет поста 999', err.getvalue())
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)), ['b']
+        )
+
+    def test_replayed_comments_are_not_duplicated(self):
+        Post.objects.create(
+            pk=700, author=User.objects.get(username='reader'), text='пост'
+        )
+        path = self.write_records('replay.jsonl', (
+            {'type': 'comment', 'id': 'c1', 'post': 700, 'author': 'reader',
+             'text': 'одинаковый'},
+            {'type': 'comment', 'post': 700, 'author': 'reader',
+             'text': 'без id', 'created': '2020-01-02T03:04:05'},
+        ))
+        for _ in range(2):
+            call_command(
+                'import_content', path, skip_derived=True, stdout=StringIO()
+            )
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(
+            Comment.objects.get(text='без id').created.year, 2020
+        )
+
+    def test_imported_image_is_referenced(self):
+        media_root = tempfile.mkdtemp(dir=self.temp_dir)
+        with override_settings(MEDIA_ROOT=media_root):
+            name = image_storage.save(
+                'posts/cat.gif', ContentFile(SMALL_GIF)
+            )
+            path = self.write_records('images.jsonl', (
+                {'type': 'post', 'author': 'reader', 'text': 'a',
+                 'image': name},
+                {'type': 'post', 'author': 'reader', 'text': 'b',
+                 'image': name},
+            ))
+            call_command(
+                'import_content', path, skip_derived=True, stdout=StringIO()
+            )
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 2)
+
+    def test_replayed_posts_are_not_duplicated(self):
+        path = self.write_records('posts.jsonl', (
+            {'type': 'post', 'author': 'reader', 'text': 'без id'},
+            {'type': 'post', 'author': 'reader', 'text': 'без id',
+             'pub_date': '2020-01-02T03:04:05'},
+            {'type': 'post', 'id': 800, 'author': 'reader', 'text': 'с id'},
+        ))
+        for _ in range(2):
+            call_command(
+                'import_content', path, skip_derived=True, stdout=StringIO()
+            )
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_replayed_csv_ids_do_not_retain_images_again(self):
+        media_root = tempfile.mkdtemp(dir=self.temp_dir)
+        with override_settings(MEDIA_ROOT=media_root):
+            name = image_storage.save(
+                'posts/cat.gif', ContentFile(SMALL_GIF)
+            )
+            path = self.write(
+                'ids.csv',
+                f'type,id,author,text,image\npost,900,reader,a,{name}\n'
+            )
+            for _ in range(2):
+                call_command(
+                    'import_content', path, skip_derived=True,
+                    stdout=StringIO()
+                )
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 1)
+
+    def test_malformed_line_is_skipped(self):
+        path = self.write('broken.jsonl', '\n'.join((
+            json.dumps({'type': 'post', 'author': 'reader', 'text': 'a'}),
+            '{"type": "post", "author":',
+            '[]',
+            json.dumps({'type': 'post', 'author': 'reader', 'text': 'b'}),
+        )))
+        err = StringIO()
+        call_command(
+            'import_content', path, skip_derived=True,
+            stdout=StringIO(), stderr=err
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertIn('Запись 2: неверный JSON', err.getvalue())
+        self.assertIn('Запись 3: запись не объект', err.getvalue())
+
+    def test_resume_builds_feeds_for_records_before_checkpoint(self):
+        reader = User.objects.get(username='reader')
+        writer = User.objects.create_user(username='writer')
+        # Подписка и пост сохранены до падения: bulk_create без сигналов
+        Follow.objects.bulk_create([Follow(user=reader, author=writer)])
+        Post.objects.bulk_create([Post(author=writer, text='до падения')])
+        path = self.write_records('resume.jsonl', (
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+            {'type': 'post', 'author': 'writer', 'text': 'до падения'},
+            {'type': 'post', 'author': 'reader', 'text': 'после'},
+        ))
+        with open(path + '.checkpoint', 'w') as file_obj:
+            json.dump({'position': 2, 'authors': [writer.pk]}, file_obj)
+        call_command('import_content', path, stdout=StringIO())
+        self.assertTrue(FeedEntry.objects.filter(
+            user=reader, post__text='до падения'
+        ).exists())
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import stem
+
+User = get_user_model()
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.cat_post = Post.objects.create(
+            author=cls.author, text='Мои коты спят на диване'
+        )
+        cls.dog_post = Post.objects.create(
+            author=cls.author, text='Собака гуляет во дворе'
+        )
+        cls.client = Client()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response.context['posts'], response.context['next_cursor']
+
+    def test_stem(self):
+        self.assertEqual(stem('котами'), stem('коты'))
+        self.assertEqual(stem('Ёжики'), stem('ежик'))
+
+    def test_finds_word_forms(self):
+        posts, _ = self.search('котами')
+        self.assertEqual(posts, [self.cat_post])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.dog_post.text = 'Теперь здесь только коты'
+        self.dog_post.save()
+        posts, _ = self.search('кот')
+        self.assertEqual(set(posts), {self.cat_post, self.dog_post})
+        self.cat_post.delete()
+        posts, _ = self.search('кот')
+        self.assertEqual(posts, [self.dog_post])
+
+    def test_cursor_pagination(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'кот номер {i}')
+            for i in range(12)
+        ])
+        for post in Post.objects.filter(text__startswith='кот номер'):
+            post.save()
+        first, cursor = self.search('кот')
+        self.assertEqual(len(first), 10)
+        second, last_cursor = self.search('кот', after=cursor)
+        self.assertEqual(len(second), 3)
+        self.assertIsNone(last_cursor)
+        self.assertFalse(set(first) & set(second))
+
+    def test_admin_uses_index(self):
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'коту'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.cat_post]
+        )
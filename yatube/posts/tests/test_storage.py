@@ -0,0 +1,179 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..conf import POST_THUMBNAILS
+from ..management.commands import gc_media
+from ..models import ImageBlob, Post
+from ..thumbnails import generate_thumbnails, resolve_thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, filename):
+        return Post.objects.create(
+            author=self.author,
+            text='test-text',
+            image=SimpleUploadedFile(
+                name=filename,
+                content=SMALL_GIF,
+                content_type='image/gif'
+            )
+        )
+
+    def test_same_content_is_stored_once(self):
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.name)]
+        )
+        self.assertEqual(
+            ImageBlob.objects.get(name=first.image.name).ref_count, 2
+        )
+
+    def test_gc_removes_unreferenced_blobs(self):
+        post = self.create_post('gc.gif')
+        path = post.image.path
+        post.delete()
+        self.assertEqual(ImageBlob.objects.get().ref_count, 0)
+        call_command('gc_blobs', grace=0, dry_run=True, stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+        os.utime(path, (0, 0))
+        call_command('gc_blobs', grace=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_gc_keeps_referenced_file_with_drifted_count(self):
+        post = self.create_post('drift.gif')
+        ImageBlob.objects.update(ref_count=0)
+        os.utime(post.image.path, (0, 0))
+        call_command('gc_blobs', grace=0, stdout=StringIO())
+        self.assertTrue(os.path.exists(post.image.path))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def test_recount_restores_blob_counts(self):
+        post = self.create_post('bulk.gif')
+        ImageBlob.objects.all().delete()
+        Post.objects.bulk_create([Post(
+            author=self.author, text='copy', image=post.image.name
+        )])
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+        Post.objects.all().delete()
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(ImageBlob.objects.get().ref_count, 0)
+
+    def test_gc_removes_stale_partial_uploads(self):
+        os.makedirs(TEMP_MEDIA_ROOT, exist_ok=True)
+        part = os.path.join(TEMP_MEDIA_ROOT, 'tmpbroken.part')
+        with open(part, 'wb') as file:
+            file.write(SMALL_GIF)
+        os.utime(part, (0, 0))
+        call_command('gc_blobs', grace=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(part))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaGarbageCollectorTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Записи sorl о миниатюрах того же файла из других тестов
+        cache.clear()
+
+    def make_old_file(self, name):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file_obj:
+            file_obj.write(SMALL_GIF)
+        os.utime(path, (0, 0))
+        return path
+
+    def test_orphans_are_removed(self):
+        author = User.objects.create_user(username='NoName')
+        post = Post.objects.create(
+            author=author,
+            text='test-text',
+            image=SimpleUploadedFile(name='kept.gif', content=SMALL_GIF)
+        )
+        generate_thumbnails(post.image.name)
+        os.utime(post.image.path, (0, 0))
+        orphan = self.make_old_file('posts/orphan.gif')
+        stale = self.make_old_file('cache/00/00/' + '0' * 32 + '.jpg')
+        fresh = os.path.join(TEMP_MEDIA_ROOT, 'posts/fresh.gif')
+        with open(fresh, 'wb') as file_obj:
+            file_obj.write(SMALL_GIF)
+
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+        self.assertIn('файлов: 2', out.getvalue())
+        self.assertTrue(os.path.exists(orphan))
+
+        call_command('gc_media', rate=1000, stdout=StringIO())
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(os.path.exists(post.image.path))
+        for thumbnail in resolve_thumbnails([post])[0].thumbnails:
+            self.assertTrue(os.path.exists(thumbnail.storage.path(
+                thumbnail.name
+            )))
+
+    def test_dropped_thumbnail_size_is_removed(self):
+        author = User.objects.create_user(username='NoName')
+        post = Post.objects.create(
+            author=author,
+            text='test-text',
+            image=SimpleUploadedFile(name='sizes.gif', content=SMALL_GIF)
+        )
+        generate_thumbnails(post.image.name)
+        paths = [
+            thumbnail.storage.path(thumbnail.name)
+            for thumbnail in resolve_thumbnails([post])[0].thumbnails
+        ]
+        for path in paths:
+            os.utime(path, (0, 0))
+        with mock.patch.object(
+            gc_media, 'POST_THUMBNAILS', POST_THUMBNAILS[-1:]
+        ):
+            call_command('gc_media', stdout=StringIO())
+        self.assertEqual(
+            [os.path.exists(path) for path in paths],
+            [False] * (len(paths) - 1) + [True]
+        )
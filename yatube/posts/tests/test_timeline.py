@@ -0,0 +1,93 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from ..models import FeedEntry, Follow, Post
+from ..utils import get_paginator
+from .. import timeline
+
+User = get_user_model()
+
+
+class FeedTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.follower)
+
+    def follow(self):
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}
+        ))
+
+    def test_new_post_is_fanned_out(self):
+        self.follow()
+        post = Post.objects.create(author=self.author, text='test-text')
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.follower, post=post
+        ).exists())
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        post = Post.objects.create(author=self.author, text='test-text')
+        self.follow()
+        self.follow()
+        self.assertEqual(Follow.objects.filter(user=self.follower).count(), 1)
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('post', flat=True)),
+            [post.pk]
+        )
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}
+        ))
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def feed(self, query=''):
+        return get_paginator(
+            Post.objects.for_feed(),
+            RequestFactory().get('/' + query),
+            paginator_class=timeline.TimelinePaginator,
+            user=self.follower
+        )
+
+    def test_popular_author_is_pulled_on_read(self):
+        self.follow()
+        with mock.patch.object(timeline, 'FEED_FANOUT_LIMIT', 0):
+            post = Post.objects.create(author=self.author, text='test-text')
+            self.assertFalse(FeedEntry.objects.exists())
+            self.assertIn(post, self.feed())
+        # Подписчиков снова меньше лимита, но пост из ленты не пропадает
+        self.assertIn(post, self.feed())
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_feed_entries_and_pulled_posts_are_merged(self):
+        popular = User.objects.create_user(username='popular')
+        self.follow()
+        Follow.objects.create(user=self.follower, author=popular)
+        pushed = [
+            Post.objects.create(author=self.author, text=f'push {i}')
+            for i in range(6)
+        ]
+        with mock.patch.object(timeline, 'FEED_FANOUT_LIMIT', 0):
+            pulled = [
+                Post.objects.create(author=popular, text=f'pull {i}')
+                for i in range(6)
+            ]
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.follower).count(), 6
+        )
+        expected = sorted(
+            pushed + pulled,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=True
+        )
+        first_page = self.feed()
+        second_page = self.feed(
+            f'?after={first_page.paginator.next_cursor}'
+        )
+        self.assertEqual(list(first_page) + list(second_page), expected)
+        self.assertIsNone(second_page.paginator.next_cursor)
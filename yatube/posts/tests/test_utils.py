@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, RequestFactory
+
+from ..conf import POSTS_COUNT
+from ..models import Post
+from ..utils import get_paginator, encode_cursor, decode_cursor
+
+
+TEST_POSTS = 13
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        Post.objects.bulk_create([Post(
+            author=cls.author,
+            text=f'test-text {i}'
+        ) for i in range(TEST_POSTS)])
+        cls.factory = RequestFactory()
+
+    def get_page(self, query=''):
+        request = self.factory.get('/' + query)
+        return get_paginator(Post.objects.all(), request)
+
+    def test_first_page(self):
+        page_obj = self.get_page()
+        self.assertEqual(len(page_obj), POSTS_COUNT)
+        self.assertIsNotNone(page_obj.paginator.next_cursor)
+        self.assertIsNone(page_obj.paginator.previous_cursor)
+
+    def test_next_and_previous_pages(self):
+        first_page = self.get_page()
+        second_page = self.get_page(
+            f'?after={first_page.paginator.next_cursor}'
+        )
+        self.assertEqual(len(second_page), TEST_POSTS - POSTS_COUNT)
+        self.assertIsNone(second_page.paginator.next_cursor)
+        back_page = self.get_page(
+            f'?before={second_page.paginator.previous_cursor}'
+        )
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_legacy_page_number(self):
+        cursor_page = self.get_page(
+            f'?after={self.get_page().paginator.next_cursor}'
+        )
+        legacy_page = self.get_page('?page=2')
+        self.assertEqual(list(legacy_page), list(cursor_page))
+        self.assertIsNotNone(legacy_page.paginator.previous_cursor)
+
+    def test_invalid_input_falls_back_to_first_page(self):
+        first_page = list(self.get_page())
+        for query in ('?page=abc', '?page=1000', '?after=broken'):
+            with self.subTest(query=query):
+                self.assertEqual(list(self.get_page(query)), first_page)
+
+    def test_cursor_round_trip(self):
+        post = Post.objects.first()
+        self.assertEqual(
+            decode_cursor(encode_cursor(post)),
+            (post.pub_date, post.pk)
+        )
@@ -1,4 +1,6 @@
+from http import HTTPStatus
 import shutil
+from io import StringIO
 import tempfile
 
 from django.contrib.auth import get_user_model
@@ -6,7 +8,7 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
-from django.conf import settings
+from django.core.management import call_command
 from django import forms
 
 from ..models import Post, Group, Comment, Follow
@@ -19,7 +21,10 @@ TEST_POSTS = 13
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -52,6 +57,8 @@ class PostViewsTests(TestCase):
         ) for i in range(TEST_POSTS)]
 
         cls.posts = Post.objects.bulk_create(posts)
+        # bulk_create не шлёт сигналов, счётчики пересобираем вручную
+        call_command('recount', stdout=StringIO())
         cls.guest_client = Client()
         cls.authorized_client = Client()
         cls.authorized_client.force_login(cls.author)
@@ -68,10 +75,10 @@ class PostViewsTests(TestCase):
 
         Follow.objects.create(user=cls.author, author=cls.user_following)
 
-        @classmethod
-        def tearDownClass(cls):
-            super().tearDownClass()
-            shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def test_pages_uses_correct_template(self):
         """в URL-адрес передан соответствующий шаблон."""
@@ -237,10 +244,10 @@ class PostViewsTests(TestCase):
     def test_cache_index(self):
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
-        Post.objects.create(
-            text='test-new-post',
-            author=self.author,
-        )
+        # update() не шлёт сигналов, поэтому поколение лент не меняется
+        Post.objects.filter(
+            pk=Post.objects.first().pk
+        ).update(text='test-changed')
         response_old = self.authorized_client.get(
             reverse('posts:index')
         )
@@ -255,6 +262,19 @@ class PostViewsTests(TestCase):
         new_posts = response_new.content
         self.assertNotEqual(old_posts, new_posts, 'Кеш не очищен')
 
+    def test_cache_index_invalidated_by_new_post(self):
+        self.authorized_client.get(reverse('posts:index'))
+        Post.objects.create(text='test-new-post', author=self.author)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'test-new-post')
+
+    def test_cache_index_varies_on_page(self):
+        first_page = self.authorized_client.get(reverse('posts:index'))
+        second_page = self.authorized_client.get(
+            reverse('posts:index') + '?page=2'
+        )
+        self.assertNotEqual(first_page.content, second_page.content)
+
     def test_following(self):
         """Тест подписки на автора."""
         client = self.authorized_client
@@ -354,3 +374,153 @@ class PostViewsTests(TestCase):
         def test_second_page_profile_contains_three_records(self):
             response = self.client.get(reverse('posts:profile') + '?page=2')
             self.assertEqual(len(response.context['object_list']), 3)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class PostQueryBudgetTests(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test-title',
+            description='test-description',
+            slug='test-slug'
+        )
+        for i in range(POSTS_COUNT):
+            author = User.objects.create_user(
+                username=f'author-{i}',
+                first_name='Имя',
+                last_name='Фамилия'
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.post = Post.objects.create(
+                author=author,
+                group=cls.group,
+                text=f'test-text {i}'
+            )
+            Comment.objects.create(
+                post=cls.post,
+                author=author,
+                text='test-comment'
+            )
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_guest_pages_query_budget(self):
+        budgets = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'}): 2,
+            reverse('posts:profile', kwargs={'username': 'author-0'}): 2,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.client.get(url)
+
+    def test_follow_index_query_budget(self):
+        # сессия, пользователь и сама лента
+        with self.assertNumQueries(3):
+            self.reader_client.get(reverse('posts:follow_index'))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        Post.objects.create(author=cls.author, text='test-text')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_without_queries(self):
+        url = reverse('posts:index')
+        etag = self.authorized_client.get(url)['ETag']
+        # сессия и пользователь, но не лента
+        with self.assertNumQueries(2):
+            response = self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_new_post_changes_validators(self):
+        url = reverse('posts:profile', kwargs={'username': 'NoName'})
+        response = self.authorized_client.get(url)
+        Post.objects.create(author=self.author, text='test-new-post')
+        response = self.authorized_client.get(
+            url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_reader(self):
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.client.get(url)['ETag'],
+            self.authorized_client.get(url)['ETag']
+        )
+
+    def test_post_in_other_group_keeps_etag(self):
+        group = Group.objects.create(title='Группа', slug='group')
+        other = Group.objects.create(title='Другая', slug='other')
+        url = reverse('posts:group_posts', kwargs={'slug': group.slug})
+        etag = self.authorized_client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='text', group=other)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='text', group=group)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_page_etag_follows_its_author_only(self):
+        post = Post.objects.get(author=self.author)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        # Автор поста ещё не в кэше: первый ответ без валидаторов
+        self.assertNotIn('ETag', self.authorized_client.get(url))
+        etag = self.authorized_client.get(url)['ETag']
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='test-other-post')
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='test-new-post')
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_followed_author_post_changes_follow_etag(self):
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:follow_index')
+        etag = client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='test-new-post')
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_cached_fragment_skips_feed_query(self):
+        url = reverse('posts:index')
+        self.authorized_client.get(url)
+        # сессия и пользователь: страница постов взята из фрагмента
+        with self.assertNumQueries(2):
+            response = self.authorized_client.get(url)
+        self.assertContains(response, 'test-text')
+
+    def test_unrelated_params_share_fragment(self):
+        url = reverse('posts:index')
+        self.authorized_client.get(url, {'page': '1'})
+        # Фрагмент тот же: лишние параметры не входят в ключ
+        with self.assertNumQueries(2):
+            response = self.authorized_client.get(
+                url, {'utm_source': 'mail', '_profile': 'x'}
+            )
+        self.assertContains(response, 'test-text')
@@ -0,0 +1,177 @@
+"""Миниатюры картинок постов.
+
+Миниатюры строятся сразу после загрузки в пуле процессов, чтобы
+Pillow-работа не занимала ни поток запроса, ни GIL. При выводе ленты
+записи sorl обо всех миниатюрах страницы читаются одним cache.get_many
+и одним SQL-запросом вместо отдельного обращения на каждую картинку.
+Там же, вне потока запроса, считается заглушка из placeholders.
+"""
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDbKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics
+
+from .conf import POST_THUMBNAILS, THUMBNAIL_WORKERS
+from .placeholders import refresh_pages, store_placeholder
+from .storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn, а не fork: дочерний процесс не наследует сокеты
+        # соединений с базой, закрытие которых оборвало бы их у родителя.
+        # Инициализатор - сам django.setup: модуль с моделями нельзя
+        # импортировать в новом процессе до настройки Django
+        _executor = ProcessPoolExecutor(
+            max_workers=THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        )
+    return _executor
+
+
+def generate_thumbnails(name):
+    """Строит все миниатюры из POST_THUMBNAILS для файла name."""
+    source = ImageFile(name, image_storage)
+    for geometry, options in POST_THUMBNAILS:
+        start = time.perf_counter()
+        try:
+            get_thumbnail(source, geometry, **options)
+        except Exception:
+            logger.exception('Не удалось построить миниатюру %s', name)
+            continue
+        metrics.observe(
+            'yatube_thumbnail_duration_seconds',
+            time.perf_counter() - start,
+            geometry=geometry
+        )
+
+
+def process_image(name):
+    """Всё, что нужно картинке после загрузки: миниатюры и заглушка."""
+    generate_thumbnails(name)
+    try:
+        # Заодно сбрасывает кэш страниц: на них появятся миниатюры
+        store_placeholder(name)
+    except Exception:
+        logger.exception('Не удалось построить заглушку %s', name)
+        refresh_pages(name)
+    # Воркер пула может долго простаивать: снимок пишется сразу
+    metrics.flush()
+
+
+def queue_thumbnails(name):
+    """Ставит обработку картинки в очередь после фиксации транзакции."""
+    def submit():
+        if THUMBNAIL_WORKERS:
+            _get_executor().submit(process_image, name)
+        else:
+            process_image(name)
+    transaction.on_commit(submit)
+
+
+def thumbnail_file(file_, geometry, options):
+    """Файл миниатюры, который построил бы get_thumbnail, без обращения к KV.
+
+    Повторяет подготовку опций из ThumbnailBackend.get_thumbnail, чтобы
+    имя и ключ совпали с теми, что sorl записал при создании.
+    """
+    backend = default.backend
+    source = ImageFile(file_)
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def get_many_raw(keys):
+    """Сырые значения KV-хранилища sorl по ключам с префиксом."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDbKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        from_db = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        kvstore.cache.set_many(
+            from_db, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        found.update(from_db)
+    return found
+
+
+def _original(post):
+    # Исходная картинка вместо миниатюр, которые ещё строит воркер
+    image = ImageFile(post.image.name, image_storage)
+    deferred = post.get_deferred_fields()
+    if 'image_width' not in deferred and 'image_height' not in deferred:
+        if post.image_width and post.image_height:
+            image.set_size((post.image_width, post.image_height))
+    return image
+
+
+def _settle(post):
+    if None in post.thumbnails:
+        post.thumbnails = [_original(post)]
+    if post.thumbnails:
+        post.thumbnail = post.thumbnails[-1]
+
+
+def resolve_thumbnails(posts):
+    """Проставляет постам с картинкой все варианты из POST_THUMBNAILS.
+
+    post.thumbnails - список вариантов от меньшего к большему,
+    post.thumbnail - самый большой из них. Если хоть одного варианта
+    ещё нет, в списке только исходная картинка: миниатюры строит
+    очередь из queue_thumbnails, а не поток запроса.
+    """
+    wanted = {}
+    for post in posts:
+        post.thumbnails = []
+        post.thumbnail = None
+        if not post.image:
+            continue
+        for geometry, options in POST_THUMBNAILS:
+            thumbnail = thumbnail_file(post.image, geometry, options)
+            wanted.setdefault(add_prefix(thumbnail.key), []).append(post)
+    if not wanted:
+        return posts
+    found = get_many_raw(list(wanted))
+    for key, waiting in wanted.items():
+        value = found.get(key)
+        thumbnail = None
+        if value and value != EMPTY_VALUE:
+            thumbnail = deserialize_image_file(value)
+        for post in waiting:
+            post.thumbnails.append(thumbnail)
+    for post in posts:
+        _settle(post)
+    return posts
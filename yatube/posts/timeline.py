@@ -0,0 +1,145 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост сразу раскладывается в FeedEntry всех подписчиков автора
+вместе с датой публикации, поэтому follow_index листает индекс
+(user, -pub_date, -post) и достаёт посты одной выборкой по id. Авторы,
+у которых подписчиков больше FEED_FANOUT_LIMIT, не рассылаются: их
+посты подмешиваются в страницу при чтении. Такой автор остаётся в
+этом режиме и после того, как подписчиков станет меньше, иначе посты,
+написанные без рассылки, пропали бы из лент.
+"""
+from django.db.models import Q
+
+from .conf import FEED_BATCH_SIZE, FEED_FANOUT_LIMIT
+from .models import AuthorStats, FeedEntry, Follow, Post
+from .utils import CursorPaginator
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= FEED_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def is_pull_author(author_id):
+    """Посты автора не рассылаются, а читаются при открытии ленты."""
+    stats = AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', 'pull_feed'
+    ).first()
+    if stats is None:
+        return False
+    followers_count, pull_feed = stats
+    if pull_feed:
+        return True
+    if FEED_FANOUT_LIMIT is None or followers_count <= FEED_FANOUT_LIMIT:
+        return False
+    AuthorStats.objects.filter(user_id=author_id).update(pull_feed=True)
+    return True
+
+
+def fan_out_post(post):
+    if is_pull_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).distinct()
+    _bulk_insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if is_pull_author(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).order_by().values_list('pk', 'pub_date')
+    _bulk_insert(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+
+
+def backfill_authors(author_ids, chunk_size=500):
+    """Раскладывает посты авторов, записанных в базу без сигналов."""
+    author_ids = list(author_ids)
+    for start in range(0, len(author_ids), chunk_size):
+        follows = Follow.objects.filter(
+            author_id__in=author_ids[start:start + chunk_size]
+        ).order_by().values_list('user_id', 'author_id')
+        for user_id, author_id in follows.iterator(chunk_size=FEED_BATCH_SIZE):
+            backfill(user_id, author_id)
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def pull_authors(user):
+    """Подписки пользователя, чьи посты читаются без рассылки."""
+    return Follow.objects.filter(
+        user=user,
+        author__stats__pull_feed=True
+    ).values('author')
+
+
+def _keyset(queryset, pk_field, cursor, newer):
+    # Строки после курсора в порядке ленты, по индексу с pub_date
+    if cursor is not None:
+        pub_date, pk = cursor
+        lookup = 'gt' if newer else 'lt'
+        queryset = queryset.filter(
+            Q(**{f'pub_date__{lookup}': pub_date})
+            | Q(pub_date=pub_date, **{f'{pk_field}__{lookup}': pk})
+        )
+    if newer:
+        return queryset.order_by('pub_date', pk_field)
+    return queryset.order_by('-pub_date', f'-{pk_field}')
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок: страница FeedEntry плюс посты pull-авторов.
+
+    Обе ветки ограничиваются размером страницы внутри подзапросов
+    (индексы (user, -pub_date, -post) и (author, -pub_date)), поэтому
+    сортируется не больше двух страниц строк, а не вся таблица постов.
+    object_list задаёт только колонки и связи постов.
+    """
+
+    def __init__(self, object_list, per_page, user):
+        super().__init__(object_list, per_page)
+        self.user = user
+
+    def _fetch(self, cursor, newer, offset, limit):
+        end = offset + limit
+        entries = _keyset(
+            FeedEntry.objects.filter(user=self.user), 'post_id', cursor, newer
+        )
+        pulled = _keyset(
+            Post.objects.filter(author__in=pull_authors(self.user)),
+            'pk', cursor, newer
+        )
+        queryset = self.object_list.filter(
+            Q(pk__in=entries.values('post_id')[:end])
+            | Q(pk__in=pulled.values('pk')[:end])
+        )
+        if newer:
+            queryset = queryset.reverse()
+        return list(queryset[offset:end])
@@ -0,0 +1,100 @@
+"""Проверка и перекодирование загружаемых картинок постов.
+
+Размер файла и число пикселей проверяются по заголовку, до полного
+декодирования, поэтому «бомба» из маленького файла с огромным
+холстом отклоняется сразу. Прошедшая проверку картинка уменьшается до
+IMAGE_MAX_SIDE по большей стороне и сохраняется заново без метаданных:
+прогрессивный JPEG для непрозрачных картинок и WebP для прозрачных.
+Небольшие GIF не перекодируются, чтобы не терять анимацию, но число
+их кадров ограничено, а комментарии и расширения убираются.
+"""
+import os
+import warnings
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .conf import (
+    GIF_MAX_FRAMES, IMAGE_MAX_SIDE, IMAGE_QUALITY, UPLOAD_MAX_BYTES,
+    UPLOAD_MAX_PIXELS
+)
+
+
+def _open_header(upload):
+    upload.seek(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            # Image.open читает только заголовок, пиксели не декодируются
+            return Image.open(upload)
+        except (
+            Image.DecompressionBombError,
+            Image.DecompressionBombWarning,
+            OSError,
+        ):
+            raise ValidationError('Не удалось прочитать картинку.')
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _clean_gif(image, upload):
+    frames = getattr(image, 'n_frames', 1)
+    width, height = image.size
+    if frames > GIF_MAX_FRAMES or width * height * frames > UPLOAD_MAX_PIXELS:
+        raise ValidationError('Слишком много кадров в GIF.')
+    # Пересохранение переносит кадры и их задержки, но не комментарии
+    # и расширения приложений
+    options = {'save_all': True}
+    if 'loop' in image.info:
+        options['loop'] = image.info['loop']
+    for key in ('comment', 'extension', 'icc_profile', 'xmp', 'exif'):
+        image.info.pop(key, None)
+    output = BytesIO()
+    image.save(output, 'GIF', **options)
+    name = os.path.splitext(os.path.basename(upload.name))[0] + '.gif'
+    return ContentFile(output.getvalue(), name=name)
+
+
+def process_upload(upload):
+    """Возвращает (файл, ширина, высота, размер в байтах) для сохранения."""
+    if upload.size > UPLOAD_MAX_BYTES:
+        raise ValidationError(
+            f'Файл больше {UPLOAD_MAX_BYTES // 1024 ** 2} МБ.'
+        )
+    image = _open_header(upload)
+    width, height = image.size
+    if width * height > UPLOAD_MAX_PIXELS:
+        raise ValidationError('Слишком большое разрешение картинки.')
+    if image.format == 'GIF' and max(width, height) <= IMAGE_MAX_SIDE:
+        content = _clean_gif(image, upload)
+        return content, width, height, content.size
+
+    bounds = (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE)
+    # Для JPEG декодер сразу уменьшает картинку кратно 1/2, 1/4, 1/8
+    image.draft('RGB', bounds)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(bounds, Image.LANCZOS)
+    output = BytesIO()
+    if _has_alpha(image):
+        image.convert('RGBA').save(
+            output, 'WEBP', quality=IMAGE_QUALITY, method=4
+        )
+        extension = '.webp'
+    else:
+        image.convert('RGB').save(
+            output,
+            'JPEG',
+            quality=IMAGE_QUALITY,
+            optimize=True,
+            progressive=True
+        )
+        extension = '.jpg'
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    content = ContentFile(output.getvalue(), name=name)
+    return content, image.width, image.height, content.size
@@ -1,10 +1,206 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
 
-from .conf import POSTS_COUNT
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.urls import NoReverseMatch, reverse
+from django.utils.dateparse import parse_datetime
 
+from .conf import POSTS_COUNT, LEGACY_PAGE_LIMIT
 
-def get_paginator(queryset, request):
-    paginator = Paginator(queryset, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj, paginator.count
+
+def encode_cursor(obj, date_field='pub_date'):
+    """Упаковывает ключ (дата, id) записи в непрозрачный токен."""
+    raw = f'{getattr(obj, date_field).isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (pub_date, id) из токена или None, если токен битый."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        date_part, pk_part = raw.rsplit('|', 1)
+        pub_date = parse_datetime(date_part)
+        pk = int(pk_part)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (pub_date, id) без OFFSET и COUNT(*).
+
+    Ссылки на соседние страницы строятся из ``next_cursor`` и
+    ``previous_cursor``; методы ``Page.has_next()`` и ``num_pages``
+    по-прежнему считают все строки, поэтому в шаблонах не используются.
+    """
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list.order_by('-pub_date', '-pk'), per_page)
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def _fetch(self, cursor, newer, offset, limit):
+        """Записи после курсора (newer - перед ним, от старых к новым)."""
+        queryset = self.object_list
+        if cursor is not None:
+            pub_date, pk = cursor
+            if newer:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+                ).reverse()
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+                )
+        return list(queryset[offset:offset + limit])
+
+    def page_after(self, cursor):
+        posts = self._fetch(cursor, False, 0, self.per_page + 1)
+        return self._build_page(
+            posts[:self.per_page],
+            has_next=len(posts) > self.per_page,
+            has_previous=True,
+        )
+
+    def page_before(self, cursor):
+        posts = self._fetch(cursor, True, 0, self.per_page + 1)
+        if not posts:
+            return self.page_by_number(1)
+        has_previous = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        posts.reverse()
+        return self._build_page(
+            posts,
+            has_next=True,
+            has_previous=has_previous,
+        )
+
+    def page_by_number(self, number):
+        """Старые ссылки ``?page=N``: OFFSET не глубже LEGACY_PAGE_LIMIT."""
+        number = min(max(number, 1), LEGACY_PAGE_LIMIT)
+        bottom = (number - 1) * self.per_page
+        posts = self._fetch(None, False, bottom, self.per_page + 1)
+        if not posts and number > 1:
+            return self.page_by_number(1)
+        return self._build_page(
+            posts[:self.per_page],
+            has_next=len(posts) > self.per_page,
+            has_previous=number > 1,
+            number=number,
+        )
+
+    def _build_page(self, posts, has_next, has_previous, number=1):
+        if posts:
+            if has_next:
+                self.next_cursor = encode_cursor(posts[-1])
+            if has_previous:
+                self.previous_cursor = encode_cursor(posts[0])
+        return Page(posts, number, self)
+
+
+class DeferredList:
+    """Список, который строится при первом обращении к нему."""
+
+    def __init__(self, load):
+        self._load = load
+        self._items = None
+
+    def _get(self):
+        if self._items is None:
+            self._items = self._load()
+        return self._items
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __getitem__(self, index):
+        return self._get()[index]
+
+
+def get_paginator(queryset, request, paginator_class=CursorPaginator,
+                  **options):
+    paginator = paginator_class(queryset, POSTS_COUNT, **options)
+    return _requested_page(paginator, request)
+
+
+def get_deferred_page(queryset, request, prepare=None,
+                      paginator_class=CursorPaginator, **options):
+    """Страница, записи которой выбираются при первом обращении.
+
+    Если фрагмент ленты взят из кэша, шаблон не трогает page_obj и
+    запросов к постам нет. Курсоры paginator появляются после выборки,
+    поэтому шаблон читает их после цикла по записям. ``prepare``
+    получает выбранные записи, например чтобы подставить миниатюры.
+    """
+    paginator = paginator_class(queryset, POSTS_COUNT, **options)
+
+    def load():
+        posts = _requested_page(paginator, request).object_list
+        if prepare is not None:
+            prepare(posts)
+        return posts
+    return Page(DeferredList(load), 1, paginator)
+
+
+def _page_request(request):
+    # Какую страницу просят: ('after' | 'before', курсор) или ('page', номер)
+    for direction in ('after', 'before'):
+        cursor = decode_cursor(request.GET.get(direction, ''))
+        if cursor is not None:
+            return direction, cursor
+    try:
+        number = int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        number = 1
+    return 'page', number
+
+
+def _requested_page(paginator, request):
+    direction, value = _page_request(request)
+    if direction == 'after':
+        return paginator.page_after(value)
+    if direction == 'before':
+        return paginator.page_before(value)
+    return paginator.page_by_number(value)
+
+
+def page_key(request):
+    """Ключ страницы ленты для {% cache %}.
+
+    В ключ входит только то, что выбирает страницу, поэтому лишние и
+    переставленные параметры адреса не плодят копий фрагмента.
+    """
+    direction, value = _page_request(request)
+    return f'{direction}:{value}'
+
+
+def post_pages(post):
+    """Адреса страниц, на которых виден пост."""
+    pages = [
+        reverse('posts:index'),
+        reverse('posts:profile', args=[post.author.username]),
+        reverse('posts:post_detail', args=[post.pk]),
+    ]
+    if post.group_id:
+        pages.extend(group_pages(post.group.slug))
+    return pages
+
+
+def author_pages_tag(author_id):
+    """Тег кэшированных страниц, где видно число постов автора."""
+    return f'author:{author_id}'
+
+
+def group_pages(slug):
+    # У групп из админки slug может не подходить под <slug:slug>
+    try:
+        return [reverse('posts:group_posts', args=[slug])]
+    except NoReverseMatch:
+        return []
@@ -1,58 +1,132 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+
+from core import page_cache
 
 from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
-from .utils import get_paginator
+from .utils import author_pages_tag, get_deferred_page, page_key
+from .timeline import TimelinePaginator
+from .counters import stats_for
+from . import feed_cache
+from .feed_cache import conditional_feed, get_generation
+from .conf import FEED_CACHE_TTL, POSTS_COUNT
+from .thumbnails import queue_thumbnails, resolve_thumbnails
+from . import search as text_search
+from .export import FORMATS, export_lines
 
 
 # Главная страница
 # @cache_page(20)
+@conditional_feed(feed_cache.index_feeds)
 def index(request):
-    page_obj, total_count = get_paginator(Post.objects.all(), request)
     context = {
-        'page_obj': page_obj
+        'page_obj': get_deferred_page(
+            Post.objects.for_feed(), request, prepare=resolve_thumbnails
+        ),
+        'feed_generation': get_generation(feed_cache.INDEX),
+        'feed_cache_ttl': FEED_CACHE_TTL,
+        'page_key': page_key(request),
     }
     return render(request, 'posts/index.html', context)
 
 
 # Страница со списком опубликованных постов
+@conditional_feed(feed_cache.group_feeds)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    page_obj, total_count = get_paginator(group.posts.all(), request)
     context = {
         'group': group,
-        'page_obj': page_obj
+        'page_obj': get_deferred_page(
+            group.posts.for_feed(), request, prepare=resolve_thumbnails
+        ),
+        'feed_generation': get_generation(feed_cache.group_feed(slug)),
+        'feed_cache_ttl': FEED_CACHE_TTL,
+        'page_key': page_key(request),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_feed(feed_cache.author_feeds)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    page_obj, posts_amount = get_paginator(author.posts.all(), request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+    stats = stats_for(author)
+    page_obj = get_deferred_page(
+        author.posts.for_feed(), request, prepare=resolve_thumbnails
+    )
     user = request.user
     following = False
     if user.is_authenticated:
         following = Follow.objects.filter(user=request.user, author=author).exists()
     context = {
         'author': author,
-        'posts_amount': posts_amount,
+        'posts_amount': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        'feed_generation': get_generation(feed_cache.author_feed(username)),
+        'feed_cache_ttl': FEED_CACHE_TTL,
+        'page_key': page_key(request),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if author != request.user and not request.user.is_staff:
+        raise PermissionDenied
+    data_format = request.GET.get('format', 'jsonl')
+    if data_format not in FORMATS:
+        data_format = 'jsonl'
+    response = StreamingHttpResponse(
+        export_lines(data_format, author),
+        content_type=f'{FORMATS[data_format]}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{author.username}.{data_format}"'
+    )
+    return response
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    after = None
+    if 'after' in request.GET:
+        after = text_search.decode_cursor(request.GET['after'])
+    ids, next_cursor = text_search.search(query, after, POSTS_COUNT)
+    found = Post.objects.for_feed().in_bulk(ids)
+    posts = [found[post_id] for post_id in ids if post_id in found]
+    resolve_thumbnails(posts)
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@conditional_feed(feed_cache.post_detail_feeds)
 def post_detail(request, post_id):
-    full_post = get_object_or_404(Post, pk=post_id)
+    full_post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
+    page_cache.tag_page(request, author_pages_tag(full_post.author_id))
+    feed_cache.remember_author(full_post)
     title = full_post.text
-    author_posts = Post.objects.filter(author=full_post.author)
+    resolve_thumbnails([full_post])
     form = CommentForm()
-    comments = full_post.comments.all()
+    comments = full_post.comments.select_related('author')
     context = {
         'title': title,
         'post': full_post,
-        'posts_amount': author_posts.count(),
+        'posts_amount': stats_for(full_post.author).posts_count,
         'form': form,
         'comments': comments,
     }
@@ -69,6 +143,8 @@ def post_create(request):
         form = form.save(commit=False)
         form.author = request.user
         form.save()
+        if form.image:
+            queue_thumbnails(form.image.name)
         return redirect('posts:profile', form.author)
     template = 'posts/post_create.html'
     context = {
@@ -89,6 +165,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data and post.image:
+            queue_thumbnails(post.image.name)
         return redirect('posts:post_detail', post.pk)
     template = 'posts/post_create.html'
     is_edit = True
@@ -112,11 +190,20 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional_feed(feed_cache.follow_feeds)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj, total_count = get_paginator(posts, request)
+    page_obj = get_deferred_page(
+        Post.objects.for_feed(),
+        request,
+        prepare=resolve_thumbnails,
+        paginator_class=TimelinePaginator,
+        user=request.user
+    )
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'feed_generation': get_generation(*feed_cache.follow_feeds(request)),
+        'feed_cache_ttl': FEED_CACHE_TTL,
+        'page_key': page_key(request),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -124,13 +211,9 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
-    # Если ниже поставить and вместо or, то при подписке возникает ошибка. А вот так все работает с одним редиректом
-    if author != request.user or follower:
-        Follow.objects.create(user=request.user, author=author)
+    # Ленту подписчика дополняет сигнал post_save у Follow
+    if author != request.user:
+        Follow.objects.get_or_create(user=request.user, author=author)
     return redirect(
         'posts:profile',
         username=username
@@ -54,18 +54,25 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
@@ -157,3 +164,55 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Бюджет SQL-запросов на один запрос к странице, по имени URL
+QUERY_BUDGETS = {
+    'posts:index': 8,
+    'posts:group_posts': 8,
+    'posts:profile': 8,
+    'posts:post_detail': 8,
+    'posts:follow_index': 8,
+}
+# Поднимать исключение при превышении бюджета; в тестах включает
+# core.test_runner.TestRunner
+QUERY_BUDGET_STRICT = False
+# Заголовки X-Query-Count и X-Query-Time видны при DEBUG и сотрудникам
+# Сколько одинаковых запросов за один ответ считать признаком N+1
+QUERY_REPEAT_THRESHOLD = 3
+
+# Страницы, которые анонимные читатели получают из кэша целиком
+PAGE_CACHE_VIEWS = (
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+)
+PAGE_CACHE_TTL = 60 * 5
+
+# Процессы для построения миниатюр после загрузки; 0 - синхронно
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Профилирование запросов по требованию (core.profiling)
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+# Сколько секунд действует токен из manage.py profile_token
+PROFILE_TOKEN_MAX_AGE = 60 * 60
+# Сколько последних снимков хранить
+PROFILE_KEEP = 200
+
+# Метрики Prometheus (core.metrics). Каталог для снимков процессов,
+# лучше на tmpfs; None - страница показывает только свой процесс
+METRICS_DIR = None
+# Как часто процесс переписывает свой снимок, в секундах
+METRICS_FLUSH_INTERVAL = 5
+# Токен для Authorization: Bearer у сборщика метрик; None - только staff
+METRICS_TOKEN = None
+
+# Журнал медленных SQL-запросов (core.slow_queries); None - выключен.
+# На сервере задаётся явно, например '/var/log/yatube/slow_queries.log':
+# каждый процесс пишет рядом свой файл с суффиксом pid
+SLOW_QUERY_LOG = None
+SLOW_QUERY_THRESHOLD_MS = 100
+# Доля медленных запросов, попадающих в журнал
+SLOW_QUERY_SAMPLE_RATE = 1.0
+SLOW_QUERY_LOG_BYTES = 10 * 1024 ** 2
+SLOW_QUERY_LOG_BACKUPS = 5